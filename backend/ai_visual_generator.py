@@ -1,49 +1,316 @@
 """AI-powered visual element generator for programmatic SEO content - Version 2"""
+import io
+import os
+import re
 import json
-from typing import Dict, List, Any
-from api.ai_handler import AIHandler
+import logging
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import islice
+from string import Formatter
+from typing import Dict, List, Any, Optional
 
-class AIVisualGenerator:
-    """Generate visual elements dynamically based on content context using AI"""
+logger = logging.getLogger(__name__)
+
+
+class _RateLimitFilter(logging.Filter):
+    """Drop a repeated log message once it has been emitted max_records times per window"""
     
-    def __init__(self):
-        self.ai_handler = AIHandler()
-        
-    def enhance_content_with_visuals(self, content_html: str, template_data: Dict[str, Any], 
-                                    enriched_data: Dict[str, Any]) -> str:
-        """Enhance content with AI-generated visual elements"""
-        
-        if not self.ai_handler.has_ai_provider():
-            # Fallback to basic visual generation if no AI
-            return self._add_basic_visuals(content_html, template_data, enriched_data)
-        
-        # Let AI generate contextually appropriate visuals
-        enhanced_content = self._generate_ai_visuals(content_html, template_data, enriched_data)
+    def __init__(self, max_records: int = 10, window: float = 60.0):
+        super().__init__()
+        self.max_records = max_records
+        self.window = window
+        self._counts: Dict[str, tuple] = {}
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        window_start, count = self._counts.get(record.msg, (now, 0))
+        if now - window_start >= self.window:
+            window_start, count = now, 0
+        self._counts[record.msg] = (window_start, count + 1)
+        return count < self.max_records
+
+
+# A provider outage fails every page; keep that from flooding the logs
+logger.addFilter(_RateLimitFilter())
+
+# Fast C JSON serializer for prompt payloads (optional, stdlib json otherwise)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@lru_cache(maxsize=None)
+def _lxml_html():
+    """libxml2-backed HTML parser for AI responses, or None (regex scan otherwise)
+    
+    Imported on first parse so loading this module for the fallback visuals stays cheap.
+    """
+    try:
+        import lxml.html
+    except ImportError:
+        return None
+    return lxml.html
+
+
+# Fallback content-type detection, one case-insensitive scan each
+_VS_RE = re.compile(r' (?:vs|versus) ', re.IGNORECASE)
+_INVESTMENT_RE = re.compile(r'investment|profitable|roi', re.IGNORECASE)
+
+# Decodes the first JSON object in an AI response and ignores any trailing prose
+_DECODER = json.JSONDecoder()
+
+# Output tokens budgeted per page of AI visuals. Batched requests get this for every
+# page they pack, so a request cap of 4000 tokens fits two pages
+_VISUAL_TOKENS_PER_PAGE = 2000
+_MAX_BATCH_TOKENS = 4000
+_MAX_BATCH_PAGES = _MAX_BATCH_TOKENS // _VISUAL_TOKENS_PER_PAGE
+
+class _PreparsedTemplate:
+    """str.format-style template split into literal chunks once, rendered with a single join"""
+    
+    def __init__(self, template: str):
+        self._chunks = tuple(
+            (literal, field) for literal, field, _, _ in Formatter().parse(template)
+        )
+    
+    def format_map(self, values: Dict[str, Any]) -> str:
+        parts = []
+        for literal, field in self._chunks:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return ''.join(parts)
+
+
+# Fallback visual templates, parsed once at import instead of per call
+_COMPARISON_VISUAL_TEMPLATE = _PreparsedTemplate("""<div style="margin: 2rem 0; border: 1px solid #e5e7eb; border-radius: 0.5rem; overflow: hidden;">
+  <table style="width: 100%; border-collapse: collapse;">
+    <thead>
+      <tr style="background: #f3f4f6;">
+        <th style="padding: 1rem; text-align: left; font-weight: 600;">Feature</th>
+        <th style="padding: 1rem; text-align: center; font-weight: 600;">{item1}</th>
+        <th style="padding: 1rem; text-align: center; font-weight: 600;">{item2}</th>
+      </tr>
+    </thead>
+    <tbody>
+      <tr style="border-top: 1px solid #e5e7eb;">
+        <td style="padding: 1rem;">Price</td>
+        <td style="padding: 1rem; text-align: center;">Check website</td>
+        <td style="padding: 1rem; text-align: center;">Check website</td>
+      </tr>
+      <tr style="border-top: 1px solid #e5e7eb; background: #f9fafb;">
+        <td style="padding: 1rem;">Rating</td>
+        <td style="padding: 1rem; text-align: center;">★★★★☆</td>
+        <td style="padding: 1rem; text-align: center;">★★★★☆</td>
+      </tr>
+      <tr style="border-top: 1px solid #e5e7eb;">
+        <td style="padding: 1rem;">Best For</td>
+        <td style="padding: 1rem; text-align: center;">Various uses</td>
+        <td style="padding: 1rem; text-align: center;">Various uses</td>
+      </tr>
+    </tbody>
+  </table>
+</div>""")
+
+_INVESTMENT_VISUAL_TEMPLATE = _PreparsedTemplate("""<div style="background: linear-gradient(135deg, #f0f9ff 0%, #e0f2fe 100%); border: 1px solid #7dd3fc; padding: 1.5rem; border-radius: 0.75rem; margin: 2rem 0;">
+  <h3 style="margin: 0 0 1rem 0; color: #0369a1;">📊 Investment Overview</h3>
+  <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 1rem;">
+    <div style="text-align: center;">
+      <div style="font-size: 1.75rem; font-weight: bold; color: #0ea5e9;">{roi_percentage}%</div>
+      <div style="color: #64748b; font-size: 0.875rem;">Estimated ROI</div>
+    </div>
+    <div style="text-align: center;">
+      <div style="font-size: 1.75rem; font-weight: bold; color: #0ea5e9;">{occupancy_rate}%</div>
+      <div style="color: #64748b; font-size: 0.875rem;">Occupancy Rate</div>
+    </div>
+  </div>
+</div>""")
+
+_STATS_VISUAL_TEMPLATE = _PreparsedTemplate("""<div style="background: #f8fafc; border: 1px solid #e2e8f0; padding: 1.5rem; border-radius: 0.5rem; margin: 2rem 0;">
+  <h3 style="margin: 0 0 1rem 0; color: #1e293b;">📌 {service} in {city}</h3>
+  <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 1rem;">
+    <div>
+      <strong style="color: #64748b;">Available Options:</strong>
+      <span style="display: block; font-size: 1.25rem; color: #1e293b;">{count}</span>
+    </div>
+    <div>
+      <strong style="color: #64748b;">Average Rating:</strong>
+      <span style="display: block; font-size: 1.25rem; color: #16a34a;">{average_rating}★</span>
+    </div>
+  </div>
+</div>""")
+
+
+def _serialize_json(data: Any, sort_keys: bool = False) -> str:
+    """Serialize data to JSON for cache keys, preferring orjson when it is installed"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(data, option=option, default=str).decode()
+        except TypeError:
+            pass
+    return json.dumps(data, sort_keys=sort_keys, default=str)
+
+
+def _bounded_json(data: Dict[str, Any], limit: int) -> str:
+    """Indented JSON of a dict, cut to limit characters without serializing past it
+    
+    Always the stdlib encoder, so the prompt text (ASCII-escaped, as json.dumps writes
+    it) and where it is cut don't depend on whether orjson is installed.
+    """
+    if not data:
+        return json.dumps(data, indent=2, default=str)[:limit]
+    
+    buffer = io.StringIO()
+    buffer.write('{')
+    for i, (key, value) in enumerate(data.items()):
+        # A one-entry dump is '{\n  "key": value\n}' - keep just the entry line(s)
+        entry = json.dumps({key: value}, indent=2, default=str)[1:-2]
+        buffer.write(entry if i == 0 else ',' + entry)
+        if buffer.tell() >= limit:
+            return buffer.getvalue()[:limit]
+    buffer.write('\n}')
+    
+    return buffer.getvalue()[:limit]
+
+
+@lru_cache(maxsize=4096)
+def _dump_flat_json(items: tuple, limit: int) -> str:
+    """Memoized prompt JSON for flat dicts, keyed on their (key, type, value) items"""
+    return _bounded_json({key: value for key, _, value in items}, limit)
+
+
+def _dump_json(data: Dict[str, Any], limit: int) -> str:
+    """Indented JSON for a prompt, truncated to limit characters"""
+    # Pages in a batch repeat the same flat dicts, so reuse their serialization
+    try:
+        items = tuple((key, type(value), value) for key, value in data.items())
+        return _dump_flat_json(items, limit)
+    except TypeError:
+        # Unhashable (nested) values - serialize directly
+        return _bounded_json(data, limit)
+
+
+# Disk cache writes between flushes; shelve also flushes when it is closed
+_DISK_SYNC_INTERVAL = 64
+
+
+class VisualCache:
+    """Cache AI visual HTML so identical page contexts skip the LLM round-trip"""
+    
+    def __init__(self, maxsize: int = 10_000, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self._store: "OrderedDict[str, str]" = OrderedDict()
+        self._disk = None
+        self._unsynced = 0
+        # Pages are enhanced from worker threads, so guard the LRU and shelve
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
         
-        return enhanced_content
+        # Optional on-disk layer so batch runs survive process restarts
+        if path:
+            import shelve
+            try:
+                self._disk = shelve.open(path)
+            except Exception as e:
+                logger.warning(f"Visual cache disabled on disk ({path}): {str(e)}")
     
-    def _generate_ai_visuals(self, content_html: str, template_data: Dict[str, Any], 
-                             enriched_data: Dict[str, Any]) -> str:
-        """Let AI generate contextually appropriate visual elements"""
+    @staticmethod
+    def make_key(content_html: str, template_data: Dict[str, Any], 
+                 enriched_data: Dict[str, Any]) -> Optional[str]:
+        """Build an exact SHA256 key from everything the prompt is built from
         
-        # Prepare comprehensive context for AI
-        prompt = f"""You are enhancing a blog post with visual elements. Analyze the content and context to create appropriate visual elements.
-
-CONTENT:
-{content_html[:1500]}
+        Returns None when the data can't be serialized (e.g. mixed str/int keys the
+        stdlib encoder can't sort); get and set treat that as "don't cache".
+        """
+        try:
+            payload = '\n'.join((
+                str(template_data.get('pattern', '')),
+                _serialize_json(template_data, sort_keys=True),
+                _serialize_json(enriched_data.get('primary_data', {}), sort_keys=True),
+                content_html[:1500]
+            ))
+        except TypeError:
+            return None
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """Return cached visual HTML for a key, or None on a miss"""
+        if key is None:
+            return None
+        with self._lock:
+            visual_html = self._store.get(key)
+            if visual_html is not None:
+                self._store.move_to_end(key)
+            elif self._disk is not None:
+                visual_html = self._disk.get(key)
+                if visual_html is not None:
+                    self._remember(key, visual_html)
+            
+            if visual_html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return visual_html
+    
+    def set(self, key: Optional[str], visual_html: str):
+        """Store AI visual HTML under a key"""
+        if key is None:
+            return
+        with self._lock:
+            self._remember(key, visual_html)
+            if self._disk is not None:
+                self._disk[key] = visual_html
+                self._unsynced += 1
+                if self._unsynced >= _DISK_SYNC_INTERVAL:
+                    self._disk.sync()
+                    self._unsynced = 0
+    
+    def close(self):
+        """Flush pending writes and close the on-disk layer"""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+                self._unsynced = 0
+    
+    def clear(self):
+        """Drop all in-memory entries"""
+        with self._lock:
+            self._store.clear()
+    
+    def _remember(self, key: str, visual_html: str):
+        """Insert into the in-memory LRU, evicting the oldest entry when full"""
+        self._store[key] = visual_html
+        self._store.move_to_end(key)
+        while len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
 
-CONTEXT:
-Title: {template_data.get('title', 'N/A')}
-Pattern: {template_data.get('pattern', 'N/A')}
-All Variables: {json.dumps(template_data, indent=2)[:500]}
 
-AVAILABLE DATA:
-{json.dumps(enriched_data.get('primary_data', {}), indent=2)[:800]}
+class AIVisualGenerator:
+    """Generate visual elements dynamically based on content context using AI"""
+    
+    # Markdown code block contents, or the response from its first HTML tag onwards
+    _CLEAN_RE = re.compile(r'```(?:html)?(.*?)```|<.*', re.DOTALL)
+    
+    # Opening/closing div and table tags for _scan_visual_elements
+    _TAG_RE = re.compile(r'<(/?)(div|table)\b[^>]*>', re.IGNORECASE)
+    
+    # Static instructions sent as the system prompt so providers can cache the prefix
+    _SYSTEM_PROMPT = """You are enhancing programmatic SEO blog posts with visual elements. Analyze the content and context of each post to create appropriate visual elements.
 
 TASK:
 Create 2-3 SIMPLE HTML visual elements for programmatic SEO. The visuals should:
 1. Be directly relevant to the content topic
-2. Use the actual data provided above
+2. Use the actual data provided for the page
 3. Be SIMPLE and SCALABLE (no complex charts or custom graphics)
 4. Use basic HTML with inline CSS
 
@@ -71,24 +338,232 @@ EXAMPLES FOR DIFFERENT CONTENT:
 - Investment: Stats boxes showing ROI%, occupancy rate, etc.
 - Products: Simple feature list with checkmarks
 
-CRITICAL: Keep it SIMPLE for scale. If this is about "Viome vs Thorne", create a basic 2-column comparison table, NOT a complex interactive comparison tool.
+CRITICAL: Keep it SIMPLE for scale. If this is about "Viome vs Thorne", create a basic 2-column comparison table, NOT a complex interactive comparison tool."""
+    
+    def __init__(self):
+        # Deferred so importing this module (e.g. for the fallback templates) stays cheap
+        from api.ai_handler import AIHandler
+        self.ai_handler = AIHandler()
+        self.visual_cache = VisualCache(path=os.environ.get('VISUAL_CACHE_PATH'))
+        # Provider keys are read once per process, so check availability once too
+        self._has_ai = self.ai_handler.has_ai_provider()
+    
+    def refresh_provider(self):
+        """Re-check AI provider availability after runtime reconfiguration"""
+        self._has_ai = self.ai_handler.has_ai_provider()
+        
+    def enhance_content_with_visuals(self, content_html: str, template_data: Dict[str, Any], 
+                                    enriched_data: Dict[str, Any]) -> str:
+        """Enhance content with AI-generated visual elements"""
+        
+        if not self._has_ai:
+            # Fallback to basic visual generation if no AI
+            return self._add_basic_visuals(content_html, template_data, enriched_data)
+        
+        # Let AI generate contextually appropriate visuals
+        enhanced_content = self._generate_ai_visuals(content_html, template_data, enriched_data)
+        
+        return enhanced_content
+    
+    async def enhance_content_with_visuals_async(self, content_html: str, template_data: Dict[str, Any], 
+                                                 enriched_data: Dict[str, Any]) -> str:
+        """Async variant of enhance_content_with_visuals for concurrent page runs"""
+        if not self._has_ai:
+            return self._add_basic_visuals(content_html, template_data, enriched_data)
+        
+        import asyncio
+        
+        # AIHandler is blocking, so overlap requests by running each in a worker thread
+        return await asyncio.to_thread(self._generate_ai_visuals, content_html, template_data, enriched_data)
+    
+    def _generate_ai_visuals(self, content_html: str, template_data: Dict[str, Any], 
+                             enriched_data: Dict[str, Any]) -> str:
+        """Let AI generate contextually appropriate visual elements"""
+        
+        # Reuse visuals from an equivalent page instead of calling the AI again
+        cache_key = self.visual_cache.make_key(content_html, template_data, enriched_data)
+        cached_visuals = self.visual_cache.get(cache_key)
+        if cached_visuals:
+            return self._insert_visuals_into_content(content_html, cached_visuals)
+        
+        # Only the page-specific context varies; instructions go in the system prompt
+        prompt = f"""{self._build_visual_context(content_html, template_data, enriched_data)}
 
 Return ONLY the HTML for the visual elements. Use inline CSS. Make it simple and data-focused."""
 
         try:
-            # Generate visuals with AI
-            visual_html = self.ai_handler.generate_content(prompt, max_tokens=2000)
+            # Generate visuals with AI, stopping once enough are complete
+            visual_html = self._stream_visual_html(prompt, max_tokens=_VISUAL_TOKENS_PER_PAGE, system=self._SYSTEM_PROMPT)
             
             if visual_html:
+                self.visual_cache.set(cache_key, visual_html)
+                
                 # Insert visuals into content at appropriate positions
                 return self._insert_visuals_into_content(content_html, visual_html)
             
-        except Exception as e:
-            print(f"AI visual generation error: {str(e)}")
+        except Exception:
+            logger.warning("AI visual generation failed", exc_info=True)
         
         # Fallback to basic visuals
         return self._add_basic_visuals(content_html, template_data, enriched_data)
     
+    def _build_visual_context(self, content_html: str, template_data: Dict[str, Any], 
+                              enriched_data: Dict[str, Any]) -> str:
+        """Format the page-specific content and data section of a visual prompt"""
+        # Trim the dicts first so large payloads are never serialized just to be sliced
+        variables = dict(islice(template_data.items(), 10))
+        data_sample = dict(islice(enriched_data.get('primary_data', {}).items(), 12))
+        
+        return f"""CONTENT:
+{content_html[:1500]}
+
+CONTEXT:
+Title: {template_data.get('title', 'N/A')}
+Pattern: {template_data.get('pattern', 'N/A')}
+All Variables: {_dump_json(variables, 500)}
+
+AVAILABLE DATA:
+{_dump_json(data_sample, 800)}"""
+    
+    async def enhance_content_with_visuals_batch(self, items: List[Dict[str, Any]], 
+                                                 batch_size: int = _MAX_BATCH_PAGES,
+                                                 concurrency: int = 16) -> List[str]:
+        """Enhance many pages, packing up to batch_size pages into each AI request
+        
+        Each item is a dict with content_html, template_data and enriched_data.
+        batch_size is capped so every page keeps its full output token budget, and at
+        most concurrency requests are in flight to respect provider rate limits.
+        With batch_size=1 every page gets its own streamed request, which stops as
+        soon as three visuals are complete.
+        Returns the enhanced HTML for every item in the same order.
+        """
+        import asyncio
+        
+        if not self._has_ai:
+            return [
+                self._add_basic_visuals(item['content_html'], item['template_data'], item['enriched_data'])
+                for item in items
+            ]
+        
+        batch_size = max(1, min(batch_size, _MAX_BATCH_PAGES))
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def generate(batch: List[Dict[str, Any]]) -> List[str]:
+            async with semaphore:
+                # Each batch is one blocking AI request, so it runs in a worker thread
+                if len(batch) == 1:
+                    item = batch[0]
+                    return [await asyncio.to_thread(
+                        self._generate_ai_visuals, item['content_html'], item['template_data'], item['enriched_data']
+                    )]
+                return await asyncio.to_thread(self._generate_ai_visuals_batch, batch)
+        
+        results = await asyncio.gather(*[generate(batch) for batch in batches], return_exceptions=True)
+        
+        # A failed batch still gets basic visuals rather than failing the whole run
+        enhanced = []
+        for batch, batch_result in zip(batches, results):
+            if isinstance(batch_result, Exception):
+                batch_result = [
+                    self._add_basic_visuals(item['content_html'], item['template_data'], item['enriched_data'])
+                    for item in batch
+                ]
+            enhanced.extend(batch_result)
+        return enhanced
+    
+    def _generate_ai_visuals_batch(self, items: List[Dict[str, Any]]) -> List[str]:
+        """Generate visuals for several pages with a single AI request"""
+        results: List[Optional[str]] = [None] * len(items)
+        pending = []
+        
+        # Serve cached pages directly and only send the rest to the AI
+        for i, item in enumerate(items):
+            cache_key = self.visual_cache.make_key(item['content_html'], item['template_data'], item['enriched_data'])
+            cached_visuals = self.visual_cache.get(cache_key)
+            if cached_visuals:
+                results[i] = self._insert_visuals_into_content(item['content_html'], cached_visuals)
+            else:
+                pending.append((i, cache_key))
+        
+        if pending:
+            item_sections = '\n\n'.join(
+                f"<<ITEM i={i}>>\n"
+                f"{self._build_visual_context(items[i]['content_html'], items[i]['template_data'], items[i]['enriched_data'])}\n"
+                f"<<END>>"
+                for i, _ in pending
+            )
+            
+            prompt = f"""Create visual elements for EACH item below.
+
+Return ONLY a JSON object in this exact format, with one entry per item:
+{{"visuals": [{{"i": <item number>, "html": "<visual elements HTML with inline CSS>"}}]}}
+
+{item_sections}"""
+            
+            try:
+                response = self.ai_handler.generate(
+                    prompt, max_tokens=_VISUAL_TOKENS_PER_PAGE * len(pending), system=self._SYSTEM_PROMPT
+                )
+                batch_visuals = self._parse_batch_response(response) if response else {}
+            except Exception:
+                logger.warning("AI batch visual generation failed", exc_info=True)
+                batch_visuals = {}
+            
+            for i, cache_key in pending:
+                visual_html = batch_visuals.get(i)
+                if visual_html:
+                    self.visual_cache.set(cache_key, visual_html)
+                    results[i] = self._insert_visuals_into_content(items[i]['content_html'], visual_html)
+        
+        # Pages the batch response did not cover fall back to basic visuals
+        return [
+            html if html is not None else self._add_basic_visuals(
+                item['content_html'], item['template_data'], item['enriched_data']
+            )
+            for html, item in zip(results, items)
+        ]
+    
+    def _parse_batch_response(self, response: str) -> Dict[int, str]:
+        """Map item numbers to visual HTML from a batched JSON response"""
+        data = None
+        start = response.find('{')
+        while start >= 0:
+            try:
+                data, _ = _DECODER.raw_decode(response, start)
+                break
+            except ValueError:
+                start = response.find('{', start + 1)
+        if not isinstance(data, dict):
+            return {}
+        
+        batch_visuals = {}
+        for entry in data.get('visuals', []):
+            if isinstance(entry, dict) and isinstance(entry.get('html'), str):
+                try:
+                    batch_visuals[int(entry.get('i'))] = entry['html']
+                except (TypeError, ValueError):
+                    continue
+        return batch_visuals
+    
+    def _stream_visual_html(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> str:
+        """Accumulate a streamed AI response until three visuals are complete"""
+        stream = self.ai_handler.generate_content_stream(prompt, max_tokens=max_tokens, system=system)
+        response = ''
+        scan = self._new_visual_scan()
+        
+        try:
+            for chunk in stream:
+                response += chunk
+                # Only scan the new text, and only when a tag may have just closed
+                if '>' in chunk and len(self._advance_visual_scan(response, scan)) >= 3:
+                    break
+        finally:
+            # Abort the remaining generation to save time and output tokens
+            stream.close()
+        
+        return response
+    
     def _insert_visuals_into_content(self, content_html: str, visual_html: str) -> str:
         """Insert AI-generated visuals at strategic points in content"""
         
@@ -101,120 +576,130 @@ Return ONLY the HTML for the visual elements. Use inline CSS. Make it simple and
         if not visuals:
             return content_html
         
-        # Split content by paragraphs
-        sections = content_html.split('</p>')
+        # Locate paragraph ends without splitting the whole document
+        paragraph_ends = []
+        pos = content_html.find('</p>')
+        while pos != -1:
+            paragraph_ends.append(pos + 4)
+            pos = content_html.find('</p>', pos + 4)
+        section_count = len(paragraph_ends) + 1
         
-        # Insert visuals at strategic positions
-        if len(visuals) >= 1 and len(sections) > 1:
+        # Pick insertion offsets at strategic positions (ascending order)
+        inserts = []
+        if len(visuals) >= 1 and section_count > 1:
             # First visual after intro paragraph
-            sections[0] += '</p>\n' + visuals[0] + '\n'
+            inserts.append((paragraph_ends[0], visuals[0]))
         
-        if len(visuals) >= 2 and len(sections) > 3:
+        if len(visuals) >= 2 and section_count > 3:
             # Second visual in middle of content
-            mid_point = len(sections) // 2
-            sections[mid_point] += '</p>\n' + visuals[1] + '\n'
+            inserts.append((paragraph_ends[section_count // 2], visuals[1]))
+        
+        if len(visuals) >= 3 and section_count > 4:
+            # Third visual after the final paragraph
+            inserts.append((paragraph_ends[-1], visuals[2]))
         
-        if len(visuals) >= 3 and len(sections) > 4:
-            # Third visual before conclusion (but not in the very last paragraph)
-            sections[-2] += '</p>\n' + visuals[2] + '\n'
+        # Assemble slices and visuals with a single join
+        parts = []
+        prev = 0
+        for offset, visual in inserts:
+            parts += [content_html[prev:offset], '\n', visual, '\n']
+            prev = offset
+        parts.append(content_html[prev:])
         
-        return ''.join(sections)
+        return ''.join(parts)
     
     def _clean_ai_response(self, response: str) -> str:
         """Clean AI response to extract only HTML"""
-        # Remove markdown code blocks
-        if '```html' in response:
-            start = response.find('```html') + 7
-            end = response.find('```', start)
-            if end > start:
-                response = response[start:end]
-        elif '```' in response:
-            start = response.find('```') + 3
-            end = response.find('```', start)
-            if end > start:
-                response = response[start:end]
-        
-        # Remove any explanatory text before first HTML tag
-        if '<' in response:
-            first_tag = response.find('<')
-            if first_tag > 0:
-                # Check if there's non-HTML content before
-                prefix = response[:first_tag].strip()
-                if prefix and not prefix.endswith('>'):
-                    response = response[first_tag:]
-        
-        return response.strip()
+        # One scan: a markdown code block, else everything from the first HTML tag
+        match = self._CLEAN_RE.search(response)
+        if match is None:
+            return response.strip()
+        
+        cleaned = match.group(1) if match.group(1) is not None else match.group(0)
+        return cleaned.strip()
     
     def _parse_visual_elements(self, visual_html: str) -> List[str]:
         """Parse individual visual elements from AI response"""
-        visuals = []
-        
-        # Find all top-level divs or tables
-        html = visual_html
-        while html:
-            # Find next top-level element
-            if html.startswith('<div'):
-                # Find matching closing div
-                end_pos = self._find_closing_tag(html, 'div')
-                if end_pos > 0:
-                    visuals.append(html[:end_pos])
-                    html = html[end_pos:].strip()
-                else:
-                    break
-            elif html.startswith('<table'):
-                # Find matching closing table
-                end_pos = self._find_closing_tag(html, 'table')
-                if end_pos > 0:
-                    visuals.append(html[:end_pos])
-                    html = html[end_pos:].strip()
-                else:
-                    break
-            else:
-                # Skip to next tag
-                next_tag = html.find('<', 1)
-                if next_tag > 0:
-                    html = html[next_tag:]
-                else:
-                    break
+        LH = _lxml_html()
+        if LH is not None:
+            try:
+                fragments = LH.fragments_fromstring(visual_html)
+                visuals = [
+                    LH.tostring(fragment, encoding='unicode', with_tail=False)
+                    for fragment in fragments
+                    if getattr(fragment, 'tag', None) in ('div', 'table')
+                ]
+                if visuals:
+                    return visuals[:3]  # Max 3 visuals
+            except Exception:
+                # Empty or unparseable response - fall back to the tag scan
+                pass
         
-        return visuals[:3]  # Max 3 visuals
+        return self._scan_visual_elements(visual_html)
+    
+    def _scan_visual_elements(self, visual_html: str) -> List[str]:
+        """Extract top-level div/table elements with a single regex pass"""
+        return self._advance_visual_scan(visual_html, self._new_visual_scan())
     
-    def _find_closing_tag(self, html: str, tag_name: str) -> int:
-        """Find the position after the closing tag for a given opening tag"""
-        tag_count = 1
-        pos = len(f'<{tag_name}')
+    @staticmethod
+    def _new_visual_scan() -> Dict[str, Any]:
+        """Fresh state for _advance_visual_scan"""
+        return {'pos': 0, 'tag': None, 'depth': 0, 'start': 0, 'visuals': []}
+    
+    def _advance_visual_scan(self, visual_html: str, scan: Dict[str, Any]) -> List[str]:
+        """Resume scanning visual_html from where the previous call on scan stopped
+        
+        visual_html must extend the text of earlier calls. Only whole tags are
+        consumed, so a tag cut off at the end is picked up once it completes.
+        """
+        visuals = scan['visuals']
+        if len(visuals) == 3:
+            return visuals
+        current_tag = scan['tag']
+        depth = scan['depth']
+        start = scan['start']
+        pos = scan['pos']
         
-        while tag_count > 0 and pos < len(html):
-            # Look for opening tag
-            open_tag = html.find(f'<{tag_name}', pos)
-            # Look for closing tag
-            close_tag = html.find(f'</{tag_name}>', pos)
+        # Single pass over div/table tags, tracking nesting of the open top-level element
+        for match in self._TAG_RE.finditer(visual_html, pos):
+            pos = match.end()
+            is_closing = match.group(1) == '/'
+            tag_name = match.group(2).lower()
             
-            if close_tag == -1:
-                return -1
+            if current_tag is None:
+                if not is_closing:
+                    current_tag = tag_name
+                    depth = 1
+                    start = match.start()
+                continue
             
-            if open_tag != -1 and open_tag < close_tag:
-                tag_count += 1
-                pos = open_tag + len(f'<{tag_name}')
-            else:
-                tag_count -= 1
-                pos = close_tag + len(f'</{tag_name}>')
-                
-        return pos if tag_count == 0 else -1
+            if tag_name != current_tag:
+                continue
+            
+            depth += -1 if is_closing else 1
+            if depth == 0:
+                visuals.append(visual_html[start:match.end()])
+                current_tag = None
+                if len(visuals) == 3:
+                    break
+        
+        scan.update(pos=pos, tag=current_tag, depth=depth, start=start)
+        return visuals  # Max 3 visuals
     
     def _add_basic_visuals(self, content_html: str, template_data: Dict[str, Any], 
                           enriched_data: Dict[str, Any]) -> str:
         """Add basic visuals without AI - simplified fallback"""
         
-        # Detect if this is a comparison
-        title = template_data.get('title', '').lower()
-        pattern = template_data.get('pattern', '').lower()
+        title = template_data.get('title', '')
+        pattern = template_data.get('pattern', '')
         
         # Create a simple visual based on content type
-        if ' vs ' in title or ' versus ' in title:
-            # Comparison visual
-            visual = self._create_simple_comparison_visual(template_data, enriched_data)
-        elif any(word in pattern for word in ['investment', 'profitable', 'roi']):
+        vs_match = _VS_RE.search(title)
+        if vs_match:
+            # Comparison visual - only a literal ' vs ' names the two items
+            parts = (title[:vs_match.start()], title[vs_match.end():]) if vs_match.group() == ' vs ' else None
+            visual = self._create_simple_comparison_visual(parts, template_data, enriched_data)
+        elif _INVESTMENT_RE.search(pattern):
             # Investment visual
             visual = self._create_simple_investment_visual(template_data, enriched_data)
         else:
@@ -228,66 +713,29 @@ Return ONLY the HTML for the visual elements. Use inline CSS. Make it simple and
         else:
             return content_html + '\n' + visual
     
-    def _create_simple_comparison_visual(self, template_data: Dict[str, Any], 
+    def _create_simple_comparison_visual(self, parts: Optional[tuple], template_data: Dict[str, Any], 
                                        enriched_data: Dict[str, Any]) -> str:
-        """Create a simple comparison table for fallback"""
+        """Create a simple comparison table for fallback from the title split around ' vs '"""
         # Extract the two items being compared
-        title = template_data.get('title', '')
-        if ' vs ' in title:
-            parts = title.split(' vs ')
+        if parts:
             item1 = parts[0].strip()
-            item2 = parts[1].split()[0].strip() if parts[1] else 'Option B'
+            following_words = parts[1].split()
+            item2 = following_words[0] if following_words else 'Option B'
         else:
             item1 = 'Option A'
             item2 = 'Option B'
         
-        return f"""<div style="margin: 2rem 0; border: 1px solid #e5e7eb; border-radius: 0.5rem; overflow: hidden;">
-  <table style="width: 100%; border-collapse: collapse;">
-    <thead>
-      <tr style="background: #f3f4f6;">
-        <th style="padding: 1rem; text-align: left; font-weight: 600;">Feature</th>
-        <th style="padding: 1rem; text-align: center; font-weight: 600;">{item1}</th>
-        <th style="padding: 1rem; text-align: center; font-weight: 600;">{item2}</th>
-      </tr>
-    </thead>
-    <tbody>
-      <tr style="border-top: 1px solid #e5e7eb;">
-        <td style="padding: 1rem;">Price</td>
-        <td style="padding: 1rem; text-align: center;">Check website</td>
-        <td style="padding: 1rem; text-align: center;">Check website</td>
-      </tr>
-      <tr style="border-top: 1px solid #e5e7eb; background: #f9fafb;">
-        <td style="padding: 1rem;">Rating</td>
-        <td style="padding: 1rem; text-align: center;">★★★★☆</td>
-        <td style="padding: 1rem; text-align: center;">★★★★☆</td>
-      </tr>
-      <tr style="border-top: 1px solid #e5e7eb;">
-        <td style="padding: 1rem;">Best For</td>
-        <td style="padding: 1rem; text-align: center;">Various uses</td>
-        <td style="padding: 1rem; text-align: center;">Various uses</td>
-      </tr>
-    </tbody>
-  </table>
-</div>"""
+        return _COMPARISON_VISUAL_TEMPLATE.format_map({'item1': item1, 'item2': item2})
     
     def _create_simple_investment_visual(self, template_data: Dict[str, Any], 
                                        enriched_data: Dict[str, Any]) -> str:
         """Create a simple investment stats visual for fallback"""
         primary_data = enriched_data.get('primary_data', {})
         
-        return f"""<div style="background: linear-gradient(135deg, #f0f9ff 0%, #e0f2fe 100%); border: 1px solid #7dd3fc; padding: 1.5rem; border-radius: 0.75rem; margin: 2rem 0;">
-  <h3 style="margin: 0 0 1rem 0; color: #0369a1;">📊 Investment Overview</h3>
-  <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 1rem;">
-    <div style="text-align: center;">
-      <div style="font-size: 1.75rem; font-weight: bold; color: #0ea5e9;">{primary_data.get('roi_percentage', '15')}%</div>
-      <div style="color: #64748b; font-size: 0.875rem;">Estimated ROI</div>
-    </div>
-    <div style="text-align: center;">
-      <div style="font-size: 1.75rem; font-weight: bold; color: #0ea5e9;">{primary_data.get('occupancy_rate', '68')}%</div>
-      <div style="color: #64748b; font-size: 0.875rem;">Occupancy Rate</div>
-    </div>
-  </div>
-</div>"""
+        return _INVESTMENT_VISUAL_TEMPLATE.format_map({
+            'roi_percentage': primary_data.get('roi_percentage', '15'),
+            'occupancy_rate': primary_data.get('occupancy_rate', '68')
+        })
     
     def _create_simple_stats_visual(self, template_data: Dict[str, Any], 
                                    enriched_data: Dict[str, Any]) -> str:
@@ -296,16 +744,9 @@ Return ONLY the HTML for the visual elements. Use inline CSS. Make it simple and
         service = template_data.get('Service', template_data.get('service', 'Options'))
         city = template_data.get('City', template_data.get('city', 'your area'))
         
-        return f"""<div style="background: #f8fafc; border: 1px solid #e2e8f0; padding: 1.5rem; border-radius: 0.5rem; margin: 2rem 0;">
-  <h3 style="margin: 0 0 1rem 0; color: #1e293b;">📌 {service} in {city}</h3>
-  <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 1rem;">
-    <div>
-      <strong style="color: #64748b;">Available Options:</strong>
-      <span style="display: block; font-size: 1.25rem; color: #1e293b;">{primary_data.get('count', 'Multiple')}</span>
-    </div>
-    <div>
-      <strong style="color: #64748b;">Average Rating:</strong>
-      <span style="display: block; font-size: 1.25rem; color: #16a34a;">{primary_data.get('average_rating', '4.5')}★</span>
-    </div>
-  </div>
-</div>"""
\ No newline at end of file
+        return _STATS_VISUAL_TEMPLATE.format_map({
+            'service': service,
+            'city': city,
+            'count': primary_data.get('count', 'Multiple'),
+            'average_rating': primary_data.get('average_rating', '4.5')
+        })
\ No newline at end of file
@@ -1,13 +1,736 @@
 """AI-powered visual element generator for programmatic SEO content"""
+import os
+import re
 import json
-from typing import Dict, List, Any
+import zlib
+import random
+import asyncio
+import hashlib
+import threading
+import time
+from collections import ChainMap, deque
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Optional
 from api.ai_handler import AIHandler
+from ai_visual_generator import VisualCache
+
+# Fast C JSON serializer for prompt payloads (optional, stdlib json otherwise)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Upper bound on cached AI visual responses held in memory per generator
+_AI_CACHE_SIZE = 4096
+
+# Circuit breaker: when more than half of the last 20 AI visual calls failed,
+# go straight to basic visuals for a minute instead of paying for more calls
+_AI_FAILURE_WINDOW = 20
+_AI_FAILURE_RATIO = 0.5
+_AI_COOLDOWN_SECONDS = 60.0
+
+# Output tokens budgeted per page of AI visuals; packed requests get this for every
+# page, so the 4000-token request cap fits two pages
+_AI_TOKENS_PER_PAGE = 1500
+_AI_MAX_BATCH_TOKENS = 4000
+_AI_MAX_BATCH_PAGES = _AI_MAX_BATCH_TOKENS // _AI_TOKENS_PER_PAGE
+
+# Upper bound on templates whose rendered basic visuals are kept for reuse
+_PREPARED_CACHE_SIZE = 256
+
+# Patterns the rule-based visuals already cover well, so the AI call is skipped
+_RULE_BASED_PATTERN_KEYWORDS = ('service', 'investment', 'profitable', 'roi')
+
+# Page content sent to the AI; the opening paragraphs are enough to pick visuals
+_PROMPT_CONTENT_CHARS = 500
+
+# Prompt JSON budget: long values are clipped and each payload is capped so a
+# wide primary_data dict doesn't inflate every prompt
+_PROMPT_VALUE_CHARS = 200
+_PROMPT_JSON_CHARS = 800
+
+# {Variable} placeholders in a template pattern
+_PATTERN_VARIABLE_RE = re.compile(r'\{([^{}]+)\}')
+
+# Pulls the two compared items out of an "X vs Y" pattern
+_VS_ITEMS_RE = re.compile(r'(\w+)\s+vs\s+(\w+)', re.IGNORECASE)
+
+# Shared RNG for per-page sample data; reseed through AIVisualGenerator.seed
+_RNG = random.Random()
+
+
+def _paragraph_ends(content_html: str) -> List[int]:
+    """Offsets just past each closing </p> tag"""
+    ends = []
+    pos = content_html.find('</p>')
+    while pos != -1:
+        ends.append(pos + 4)
+        pos = content_html.find('</p>', pos + 4)
+    return ends
+
+
+def _splice(content_html: str, inserts: List[tuple]) -> str:
+    """Insert (offset, html) pairs, given in ascending offset order, with one join"""
+    parts = []
+    prev = 0
+    for offset, html in inserts:
+        parts.append(content_html[prev:offset])
+        parts.append(html)
+        prev = offset
+    parts.append(content_html[prev:])
+    return ''.join(parts)
+
+
+@lru_cache(maxsize=1024)
+def _pattern_variables(pattern: str) -> frozenset:
+    """Variable names referenced by a template pattern"""
+    return frozenset(_PATTERN_VARIABLE_RE.findall(pattern))
+
+
+def _prompt_variables(template_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Template variables worth sending to the AI: the title, pattern and its placeholders"""
+    referenced = _pattern_variables(template_data.get('pattern', ''))
+    if not referenced:
+        return template_data
+    return {
+        key: value for key, value in template_data.items()
+        if key in referenced or key in ('title', 'pattern')
+    }
+
+
+def _compact_json(data: Dict[str, Any], limit: int = _PROMPT_JSON_CHARS) -> str:
+    """Compact prompt JSON with long string values clipped, cut to limit characters"""
+    clipped = {
+        key: value[:_PROMPT_VALUE_CHARS] if isinstance(value, str) else value
+        for key, value in data.items()
+    }
+    if orjson is not None:
+        try:
+            return orjson.dumps(clipped, option=orjson.OPT_NON_STR_KEYS, default=str).decode()[:limit]
+        except TypeError:
+            pass
+    return json.dumps(clipped, separators=(',', ':'), ensure_ascii=False, default=str)[:limit]
+
+
+def _frozen_strategy(intro: Dict[str, Any], main: Dict[str, Any], support: Dict[str, Any]) -> Mapping[str, Any]:
+    """Read-only visual strategy shared by every page of a content type"""
+    return MappingProxyType({
+        'intro_visual': MappingProxyType(intro),
+        'main_visual': MappingProxyType(main),
+        'support_visual': MappingProxyType(support)
+    })
+
+
+# Default visual strategy per detected content type
+_VISUAL_STRATEGIES = {
+    'comparison': _frozen_strategy(
+        {'type': 'comparison_cards', 'title': 'Quick Comparison', 'focus': 'features'},
+        {'type': 'comparison_table', 'title': 'Detailed Comparison', 'columns': ('Feature', 'Option 1', 'Option 2')},
+        {'type': 'benefits_grid', 'title': 'Key Differences', 'items': 4}
+    ),
+    'how_to': _frozen_strategy(
+        {'type': 'process_steps', 'title': 'Steps Overview', 'focus': 'process'},
+        {'type': 'checklist', 'title': 'Requirements Checklist', 'items': 6},
+        {'type': 'quick_facts', 'title': 'Tips & Best Practices', 'focus': 'tips'}
+    ),
+    'investment': _frozen_strategy(
+        {'type': 'stats_box', 'title': 'Investment Overview', 'focus': 'roi'},
+        {'type': 'pricing_tiers', 'title': 'Revenue Breakdown', 'columns': ('Basic', 'Standard', 'Premium')},
+        {'type': 'rating_chart', 'title': 'Market Performance', 'focus': 'performance'}
+    ),
+    'location_service': _frozen_strategy(
+        {'type': 'stats_box', 'title': 'Quick Stats', 'focus': 'providers'},
+        {'type': 'comparison_table', 'title': 'Top Providers', 'columns': ('Provider', 'Rating', 'Price')},
+        {'type': 'checklist', 'title': 'What to Expect', 'items': 6}
+    ),
+    'product': _frozen_strategy(
+        {'type': 'pricing_tiers', 'title': 'Pricing Options', 'focus': 'pricing'},
+        {'type': 'comparison_cards', 'title': 'Product Features', 'columns': ()},
+        {'type': 'rating_chart', 'title': 'Customer Reviews', 'focus': 'satisfaction'}
+    ),
+    # Generic fallback
+    'generic': _frozen_strategy(
+        {'type': 'quick_facts', 'title': 'Key Information', 'focus': 'general'},
+        {'type': 'comparison_cards', 'title': 'Options Available', 'columns': ()},
+        {'type': 'benefits_grid', 'title': 'Key Benefits', 'items': 4}
+    )
+}
+
+
+@lru_cache(maxsize=1024)
+def _normalize_pattern(pattern: str) -> str:
+    """Lowercased pattern, computed once per distinct template pattern"""
+    return pattern.lower()
+
+
+# Keyword groups used to classify template patterns
+_INVESTMENT_WORDS = ('investment', 'profitable', 'roi', 'return', 'income', 'revenue')
+_PRODUCT_INDICATORS = ('iphone', 'samsung', 'laptop', 'camera', 'phone', 'tablet', 'gadget')
+_PRICE_WORDS = ('price', 'cost', 'buy', 'purchase')
+_LOCATION_INDICATORS = ('in ', 'near', 'local', ' at ')
+_SERVICE_WORDS = ('plumber', 'electrician', 'contractor', 'repair', 'service', 'provider', 
+                  'lawyer', 'doctor', 'dentist', 'restaurant', 'shop', 'store', 'company', 'companies')
+_PRODUCT_WORDS = ('product', 'buy', 'purchase', 'shop', 'price', 'cost')
+
+
+def _contains_any(text: str, words: tuple) -> bool:
+    """Substring test over a keyword group, stopping at the first hit"""
+    # A plain loop avoids the generator frame any() needs per call
+    for word in words:
+        if word in text:
+            return True
+    return False
+
+
+@lru_cache(maxsize=1024)
+def _classify_pattern(pattern_lower: str) -> str:
+    """Detect the type of content from an already lowercased pattern"""
+    # Check for comparison content first (most specific)
+    if ' vs ' in pattern_lower or ' versus ' in pattern_lower or 'comparison' in pattern_lower:
+        return 'comparison'
+    
+    # Check for how-to content
+    if pattern_lower.startswith('how to') or 'guide' in pattern_lower or 'tutorial' in pattern_lower:
+        return 'how_to'
+    
+    # Check for investment/ROI content
+    if _contains_any(pattern_lower, _INVESTMENT_WORDS):
+        return 'investment'
+    
+    # Check for product content (with product names or price focus)
+    if _contains_any(pattern_lower, _PRODUCT_INDICATORS) and _contains_any(pattern_lower, _PRICE_WORDS):
+        return 'product'
+    
+    # Check for location-based service - look for service words + location indicators
+    if _contains_any(pattern_lower, _LOCATION_INDICATORS) and (
+            'best' in pattern_lower or _contains_any(pattern_lower, _SERVICE_WORDS)):
+        return 'location_service'
+    
+    # Generic product check (fallback)
+    if _contains_any(pattern_lower, _PRODUCT_WORDS):
+        return 'product'
+    
+    # Default to generic
+    return 'generic'
+
+
+@lru_cache(maxsize=256)
+def _default_strategy(pattern_lower: str) -> Mapping[str, Any]:
+    """Shared default strategy for a lowercased pattern; callers must not mutate it"""
+    return _VISUAL_STRATEGIES[_classify_pattern(pattern_lower)]
+
+
+def _template_rng(*key: str) -> random.Random:
+    """RNG seeded from template fields, stable across processes unlike hash()"""
+    return random.Random(zlib.crc32('\x1f'.join(key).encode('utf-8')))
+
+
+@lru_cache(maxsize=256)
+def _placeholder_providers(pattern_lower: str, service: str) -> tuple:
+    """Sample provider rows drawn once per (pattern, service) and reused for every page"""
+    rng = _template_rng(pattern_lower, service)
+    return tuple(
+        (f'{service} Provider {i+1}', round(4.0 + rng.random(), 1), rng.randint(50, 500),
+         f'${rng.randint(100, 400)}', f'{rng.randint(1, 6)}h')
+        for i in range(5)
+    )
+
+
+@lru_cache(maxsize=256)
+def _placeholder_rating_distribution(pattern_lower: str) -> tuple:
+    """Normalized 5★..1★ percentages drawn once per pattern"""
+    rng = _template_rng(pattern_lower)
+    counts = (rng.randint(60, 75), rng.randint(15, 25), rng.randint(5, 10),
+              rng.randint(1, 3), rng.randint(0, 2))
+    total = sum(counts)
+    return tuple(int(count * 100 / total) for count in counts)
+
+
+# Fallback values for stats box fields missing from primary_data, per content type
+_COMPARISON_STATS_DEFAULTS = {
+    'price_diff': 50, 'feature_count_1': 12, 'feature_count_2': 10,
+    'rating_1': 4.5, 'rating_2': 4.3, 'market_share_1': 35, 'market_share_2': 28
+}
+_HOW_TO_STATS_DEFAULTS = {
+    'time_required': '30 mins', 'difficulty': 'Beginner', 'step_count': 5, 'success_rate': 92
+}
+_PROVIDER_STATS_DEFAULTS = {
+    'provider_count': 45, 'average_rating': 4.5, 'min_price': 95, 'max_price': 350,
+    'average_response_time': '2-4 hrs'
+}
+_ROI_STATS_DEFAULTS = {
+    'roi_percentage': 15, 'occupancy_rate': 68, 'average_nightly_rate': 127, 'total_listings': 342
+}
+_PRODUCT_STATS_DEFAULTS = {
+    'min_price': 29, 'average_rating': 4.4, 'stock_count': 127, 'shipping_time': '2-3 days'
+}
+_GENERIC_STATS_DEFAULTS = {'count': 50, 'rating': 4.5, 'availability': 85}
+
+
+# Stats box builders: primary_data -> four (label, value, colour) cells, with
+# missing data falling back to the defaults above
+def _comparison_stats(primary_data: Dict[str, Any]) -> List[tuple]:
+    # For comparisons, show differentiating stats
+    data = ChainMap(primary_data, _COMPARISON_STATS_DEFAULTS)
+    return [
+        ('Price Difference', f"${abs(data['price_diff'])}", 'blue'),
+        ('Feature Count', f"{data['feature_count_1']} vs {data['feature_count_2']}", 'green'),
+        ('User Rating', f"{data['rating_1']}★ vs {data['rating_2']}★", 'purple'),
+        ('Market Share', f"{data['market_share_1']}% vs {data['market_share_2']}%", 'amber')
+    ]
+
+
+def _how_to_stats(primary_data: Dict[str, Any]) -> List[tuple]:
+    # For how-to content, show process stats
+    data = ChainMap(primary_data, _HOW_TO_STATS_DEFAULTS)
+    return [
+        ('Time Required', data['time_required'], 'blue'),
+        ('Difficulty', data['difficulty'], 'green'),
+        ('Steps', data['step_count'], 'purple'),
+        ('Success Rate', f"{data['success_rate']}%", 'amber')
+    ]
+
+
+def _provider_stats(primary_data: Dict[str, Any]) -> List[tuple]:
+    data = ChainMap(primary_data, _PROVIDER_STATS_DEFAULTS)
+    return [
+        ('Providers', data['provider_count'], 'blue'),
+        ('Avg Rating', f"{data['average_rating']}★", 'green'),
+        ('Price Range', f"${data['min_price']}-${data['max_price']}", 'purple'),
+        ('Response', data['average_response_time'], 'amber')
+    ]
+
+
+def _roi_stats(primary_data: Dict[str, Any]) -> List[tuple]:
+    data = ChainMap(primary_data, _ROI_STATS_DEFAULTS)
+    return [
+        ('ROI', f"{data['roi_percentage']}%", 'green'),
+        ('Occupancy', f"{data['occupancy_rate']}%", 'blue'),
+        ('Nightly Rate', f"${data['average_nightly_rate']}", 'purple'),
+        ('Listings', data['total_listings'], 'amber')
+    ]
+
+
+def _product_stats(primary_data: Dict[str, Any]) -> List[tuple]:
+    data = ChainMap(primary_data, _PRODUCT_STATS_DEFAULTS)
+    return [
+        ('Starting Price', f"${data['min_price']}", 'blue'),
+        ('Avg Rating', f"{data['average_rating']}★", 'green'),
+        ('In Stock', f"{data['stock_count']} units", 'purple'),
+        ('Ships In', data['shipping_time'], 'amber')
+    ]
+
+
+def _generic_stats(primary_data: Dict[str, Any]) -> List[tuple]:
+    data = ChainMap(primary_data, _GENERIC_STATS_DEFAULTS)
+    return [
+        ('Options', data['count'], 'blue'),
+        ('Rating', f"{data['rating']}★", 'green'),
+        ('Availability', f"{data['availability']}%", 'purple'),
+        ('Updated', 'Recently', 'amber')
+    ]
+
+
+_STATS_BUILDERS = {
+    'comparison': _comparison_stats,
+    'how_to': _how_to_stats,
+    'providers': _provider_stats,
+    'roi': _roi_stats,
+    'product': _product_stats,
+    'generic': _generic_stats
+}
+
+
+@lru_cache(maxsize=64)
+def _stats_kind(content_type: str, focus: str) -> str:
+    """Which stats builder a content type and visual focus map to"""
+    if content_type in ('comparison', 'how_to'):
+        return content_type
+    if focus == 'providers' or content_type == 'location_service':
+        return 'providers'
+    if focus == 'roi' or content_type == 'investment':
+        return 'roi'
+    if content_type == 'product':
+        return 'product'
+    return 'generic'
+
+
+# Fallback values for the feature comparison table
+_COMPARISON_TABLE_DEFAULTS = {
+    'price_1': 99, 'price_2': 149, 'users_1': 5, 'users_2': 'Unlimited',
+    'storage_1': '10GB', 'storage_2': '100GB', 'integrations_1': 50, 'integrations_2': 200
+}
+
+# primary_data fields the rule-based visuals read; other fields don't change
+# their output, so prepared visuals are shared across pages that differ only there
+_VISUAL_DATA_FIELDS = frozenset().union(
+    _COMPARISON_STATS_DEFAULTS, _HOW_TO_STATS_DEFAULTS, _PROVIDER_STATS_DEFAULTS,
+    _ROI_STATS_DEFAULTS, _PRODUCT_STATS_DEFAULTS, _GENERIC_STATS_DEFAULTS,
+    _COMPARISON_TABLE_DEFAULTS, ('top_providers', 'min_price', 'max_price', 'average_rating')
+)
+
+
+# Shared stylesheet for the rule-based visuals, emitted once per page so each
+# element only carries class names instead of repeating inline styles
+_STYLESHEET = (
+    '<style>'
+    '.pseo-visual{margin:2rem 0}'
+    '.pseo-muted{color:#64748b}'
+    '.pseo-c-blue{color:#3b82f6}.pseo-c-green{color:#10b981}.pseo-c-purple{color:#8b5cf6}'
+    '.pseo-c-amber{color:#f59e0b}.pseo-c-gray{color:#94a3b8}'
+    '.pseo-stats{background:linear-gradient(135deg,#eff6ff 0%,#f3e8ff 100%);border:2px solid #c7d2fe;'
+    'padding:1.5rem;border-radius:.75rem;margin:2rem 0}'
+    '.pseo-stats h3{margin:0 0 1rem 0;color:#1e293b;font-size:1.25rem}'
+    '.pseo-stats-grid{display:grid;grid-template-columns:repeat(2,1fr);gap:1rem}'
+    '.pseo-stats-cell{text-align:center}'
+    '.pseo-value{font-size:1.75rem;font-weight:bold}'
+    '.pseo-label{color:#64748b;font-size:.875rem}'
+    '.pseo-scroll{overflow-x:auto}'
+    '.pseo-table{width:100%;border-collapse:collapse;box-shadow:0 1px 3px rgba(0,0,0,.1)}'
+    '.pseo-table thead tr{background:#f8fafc}'
+    '.pseo-table th{padding:.75rem;text-align:center;border-bottom:2px solid #e2e8f0}'
+    '.pseo-table td{padding:.75rem;text-align:center;border-bottom:1px solid #e2e8f0}'
+    '.pseo-table th:first-child,.pseo-table td:first-child{text-align:left}'
+    '.pseo-table td:first-child,.pseo-table .pseo-strong{font-weight:600}'
+    '.pseo-table tbody tr{background:#fff}.pseo-table tbody tr:nth-child(even){background:#f9fafb}'
+    '.pseo-table .pseo-rating{color:#10b981;font-weight:bold}'
+    '.pseo-panel{background:#f9fafb;padding:1.5rem;border-radius:.5rem}'
+    '.pseo-checklist{display:grid;grid-template-columns:repeat(2,1fr);gap:.75rem}'
+    '.pseo-check{display:flex;align-items:center}'
+    '.pseo-check-icon{font-size:1.25rem;margin-right:.5rem}'
+    '.pseo-tiers{display:grid;grid-template-columns:repeat(3,1fr);gap:1rem}'
+    '.pseo-tier{padding:1.5rem;border-radius:.5rem;text-align:center}'
+    '.pseo-tier h4{margin:0 0 .5rem 0}'
+    '.pseo-tier-price{font-size:2rem;font-weight:bold}'
+    '.pseo-tier ul{list-style:none;padding:0;margin:1rem 0 0 0;text-align:left;font-size:.875rem}'
+    '.pseo-tier-basic{background:#f3f4f6;color:#6b7280}.pseo-tier-basic .pseo-tier-price{color:#1f2937}'
+    '.pseo-tier-popular{background:linear-gradient(135deg,#e0e7ff 0%,#c7d2fe 100%);border:2px solid #6366f1;color:#4f46e5}'
+    '.pseo-tier-premium{background:#fef3c7;color:#92400e}'
+    '.pseo-rating-summary{text-align:center;margin-bottom:1.5rem}'
+    '.pseo-rating-avg{font-size:2.5rem;font-weight:bold;color:#10b981}'
+    '.pseo-bar-row{display:flex;align-items:center;margin-bottom:.5rem}'
+    '.pseo-bar-stars{width:3rem;color:#64748b}'
+    '.pseo-bar-pct{width:3rem;text-align:right;color:#64748b}'
+    '.pseo-bar-track{flex:1;height:1.5rem;background:#e5e7eb;border-radius:.25rem;margin:0 .5rem}'
+    '.pseo-bar{height:100%;border-radius:.25rem}'
+    '.pseo-bar-high{background:#10b981}.pseo-bar-mid{background:#f59e0b}.pseo-bar-low{background:#ef4444}'
+    '.pseo-steps{display:flex;justify-content:space-between;align-items:center;flex-wrap:wrap}'
+    '.pseo-step{text-align:center;flex:1;min-width:120px;margin:.5rem}'
+    '.pseo-step-num{width:3rem;height:3rem;background:#6366f1;color:white;border-radius:50%;display:flex;'
+    'align-items:center;justify-content:center;margin:0 auto .5rem;font-weight:bold}'
+    '.pseo-step-name{font-weight:600;color:#1e293b}'
+    '.pseo-step-desc{font-size:.75rem;color:#64748b;margin-top:.25rem}'
+    '.pseo-arrow{color:#cbd5e1;font-size:1.5rem}'
+    '</style>'
+)
+
+# Pre-built HTML templates for the rule-based visuals, filled with str.format
+_STATS_BOX_TMPL = '''<div class="pseo-stats">
+  <h3>📊 {title}</h3>
+  <div class="pseo-stats-grid">{cells}
+  </div>
+</div>'''
+
+_STATS_CELL_TMPL = '''
+    <div class="pseo-stats-cell">
+      <div class="pseo-value pseo-c-{color}">{value}</div>
+      <div class="pseo-label">{label}</div>
+    </div>'''
+
+_TABLE_TMPL = '''<div class="pseo-visual">
+  <h3>{title}</h3>
+  <div class="pseo-scroll">
+    <table class="pseo-table">
+      <thead>
+        <tr>{head}
+        </tr>
+      </thead>
+      <tbody>{rows}
+      </tbody>
+    </table>
+  </div>
+</div>'''
+
+_FEATURE_TABLE_HEAD_TMPL = '''
+          <th>Feature</th>
+          <th>{item1}</th>
+          <th>{item2}</th>'''
+
+_FEATURE_ROW_TMPL = '''
+        <tr>
+          <td>{feature}</td>
+          <td>{val1}</td>
+          <td>{val2}</td>
+        </tr>'''
+
+# Body of the feature comparison table; only the two columns' data fields are
+# left as placeholders, the labels and static cells are rendered up front
+_FEATURE_ROWS_TMPL = ''.join(
+    _FEATURE_ROW_TMPL.format(feature=feature, val1=val1, val2=val2)
+    for feature, val1, val2 in (
+        ('Price', '${price_1}/mo', '${price_2}/mo'),
+        ('Free Trial', '14 days', '30 days'),
+        ('User Limit', '{users_1} users', '{users_2}'),
+        ('Storage', '{storage_1}', '{storage_2}'),
+        ('Support', '24/7 Email', '24/7 Phone & Email'),
+        ('Integration', '{integrations_1}+ apps', '{integrations_2}+ apps')
+    )
+)
+
+_PROVIDER_TABLE_HEAD = '''
+          <th>Provider</th>
+          <th>Rating</th>
+          <th>Reviews</th>
+          <th>Est. Price</th>
+          <th>Response</th>'''
+
+_PROVIDER_ROW_TMPL = '''
+        <tr>
+          <td>{name}</td>
+          <td class="pseo-rating">{rating}★</td>
+          <td>{reviews}</td>
+          <td class="pseo-strong">{price}</td>
+          <td>{response}</td>
+        </tr>'''
+
+_CHECKLIST_TMPL = '''<div class="pseo-visual">
+  <h3>{title}</h3>
+  <div class="pseo-panel">
+    <div class="pseo-checklist">{items}
+    </div>
+  </div>
+</div>'''
+
+_CHECKLIST_ITEM_TMPL = '''
+      <div class="pseo-check">
+        <span class="pseo-check-icon">{icon}</span>
+        <span class="pseo-c-{color}">{item}</span>
+      </div>'''
+
+_PRICING_TIERS_TMPL = '''<div class="pseo-visual">
+  <h3>{title}</h3>
+  <div class="pseo-tiers">
+    <div class="pseo-tier pseo-tier-basic">
+      <h4>Basic</h4>
+      <div class="pseo-tier-price">${min_price}</div>
+      <ul>
+        <li>• Standard service</li>
+        <li>• 30-day warranty</li>
+        <li>• Business hours</li>
+      </ul>
+    </div>
+    <div class="pseo-tier pseo-tier-popular">
+      <h4>Popular</h4>
+      <div class="pseo-tier-price">${mid_price}</div>
+      <ul>
+        <li>• Priority service</li>
+        <li>• 90-day warranty</li>
+        <li>• Extended hours</li>
+      </ul>
+    </div>
+    <div class="pseo-tier pseo-tier-premium">
+      <h4>Premium</h4>
+      <div class="pseo-tier-price">${max_price}+</div>
+      <ul>
+        <li>• VIP service</li>
+        <li>• 1-year warranty</li>
+        <li>• 24/7 availability</li>
+      </ul>
+    </div>
+  </div>
+</div>'''
+
+_RATING_CHART_TMPL = '''<div class="pseo-visual">
+  <h3>Customer Satisfaction</h3>
+  <div class="pseo-panel">
+    <div class="pseo-rating-summary">
+      <div class="pseo-rating-avg">{avg_rating}★</div>
+      <div class="pseo-muted">Average Rating</div>
+    </div>{bars}
+  </div>
+</div>'''
+
+_RATING_BAR_TMPL = '''
+    <div class="pseo-bar-row">
+      <span class="pseo-bar-stars">{stars}★</span>
+      <div class="pseo-bar-track">
+        <div class="pseo-bar pseo-bar-{level}" style="width: {pct}%;"></div>
+      </div>
+      <span class="pseo-bar-pct">{pct}%</span>
+    </div>'''
+
+# Rating chart with its five bars unrolled, so a chart is a single format call
+_RATING_CHART_FULL_TMPL = _RATING_CHART_TMPL.format(
+    avg_rating='{avg_rating}',
+    bars=''.join(
+        _RATING_BAR_TMPL.format(stars=stars, pct=f'{{pct{stars}}}', level=level)
+        for stars, level in ((5, 'high'), (4, 'high'), (3, 'mid'), (2, 'low'), (1, 'low'))
+    )
+)
+
+_PROCESS_STEPS_TMPL = '''<div class="pseo-visual">
+  <h3>{title}</h3>
+  <div class="pseo-steps">{steps}
+  </div>
+</div>'''
+
+_PROCESS_STEP_TMPL = '''
+    <div class="pseo-step">
+      <div class="pseo-step-num">{number}</div>
+      <div class="pseo-step-name">{step}</div>
+      <div class="pseo-step-desc">{desc}</div>
+    </div>'''
+
+_PROCESS_ARROW = '''
+    <div class="pseo-arrow">→</div>'''
+
+
+def _contextual_checklist_items(service: str, num_items: int) -> List[tuple]:
+    """Get context-appropriate checklist items"""
+    # Common features for services
+    all_features = [
+        ('Licensed & Insured', True),
+        ('Free Estimates', True),
+        ('24/7 Emergency Service', True),
+        ('Warranty Included', True),
+        ('Online Booking', _RNG.choice((True, False))),
+        ('Same-Day Service', _RNG.choice((True, False))),
+        ('Senior Discounts', True),
+        ('Eco-Friendly Options', _RNG.choice((True, False))),
+        ('Payment Plans', _RNG.choice((True, False))),
+        ('Mobile Service', _RNG.choice((True, False)))
+    ]
+    
+    # Select requested number of items
+    return all_features[:num_items]
+
+
+# Visuals that only depend on template-level values render once and are
+# reused for every page of the template (e.g. all cities for one service)
+@lru_cache(maxsize=2048)
+def _render_checklist(title: str, service_lower: str, num_items: int) -> str:
+    rendered = ''.join(
+        _CHECKLIST_ITEM_TMPL.format(icon='✅' if included else '❌',
+                                    color='green' if included else 'gray', item=item)
+        for item, included in _contextual_checklist_items(service_lower, num_items)
+    )
+    return _CHECKLIST_TMPL.format(title=title, items=rendered)
+
+
+@lru_cache(maxsize=2048)
+def _render_pricing_tiers(title: str, min_price: int, max_price: int) -> str:
+    return _PRICING_TIERS_TMPL.format(title=title, min_price=min_price,
+                                      mid_price=(min_price + max_price) // 2, max_price=max_price)
+
+
+@lru_cache(maxsize=2048)
+def _render_process_steps(title: str, service_lower: str) -> str:
+    steps = [
+        ('Contact', f'Reach out for {service_lower} consultation'),
+        ('Quote', 'Receive detailed estimate'),
+        ('Schedule', 'Book convenient appointment'),
+        ('Service', 'Professional work completed'),
+        ('Follow-up', 'Satisfaction guaranteed')
+    ]
+    rendered = _PROCESS_ARROW.join(
+        _PROCESS_STEP_TMPL.format(number=i + 1, step=step, desc=desc)
+        for i, (step, desc) in enumerate(steps)
+    )
+    return _PROCESS_STEPS_TMPL.format(title=title, steps=rendered)
+
+
+# Decodes the first JSON object in an AI response and ignores any trailing prose
+_DECODER = json.JSONDecoder()
+
+
+def _parse_batch_visuals(response: str) -> Dict[int, str]:
+    """Map item numbers to visual HTML from a batched JSON response"""
+    data = None
+    start = response.find('{')
+    while start >= 0:
+        try:
+            data, _ = _DECODER.raw_decode(response, start)
+            break
+        except ValueError:
+            start = response.find('{', start + 1)
+    if not isinstance(data, dict):
+        return {}
+    
+    batch_visuals = {}
+    for entry in data.get('visuals', []):
+        if isinstance(entry, dict) and isinstance(entry.get('html'), str):
+            try:
+                batch_visuals[int(entry.get('i'))] = entry['html']
+            except (TypeError, ValueError):
+                continue
+    return batch_visuals
+
+
+# Opening/closing div and table tags in AI visual HTML
+_VISUAL_TAG_RE = re.compile(r'<(/?)(div|table)\b[^>]*>', re.IGNORECASE)
+
+
+def _scan_visual_elements(visual_html: str, limit: int = 3) -> List[str]:
+    """Extract top-level div/table elements with a single regex pass"""
+    visuals = []
+    current_tag = None
+    depth = 0
+    start = 0
+    
+    # Track nesting of the open top-level element only, so other tags are skipped cheaply
+    for match in _VISUAL_TAG_RE.finditer(visual_html):
+        is_closing = match.group(1) == '/'
+        tag_name = match.group(2).lower()
+        
+        if current_tag is None:
+            if not is_closing:
+                current_tag = tag_name
+                depth = 1
+                start = match.start()
+            continue
+        
+        if tag_name != current_tag:
+            continue
+        
+        depth += -1 if is_closing else 1
+        if depth == 0:
+            visuals.append(visual_html[start:match.end()])
+            current_tag = None
+            if len(visuals) == limit:
+                break
+    
+    return visuals
+
+
+@dataclass
+class PreparedVisuals:
+    """Rendered basic visuals for one template, reused across its pages"""
+    intro_html: str = ''
+    main_html: str = ''
+    support_html: str = ''
+
 
 class AIVisualGenerator:
     """Generate visual elements dynamically based on content context"""
     
     def __init__(self):
         self.ai_handler = AIHandler()
+        # AI visual responses, optionally persisted next to the main generator's cache
+        cache_path = os.environ.get('VISUAL_CACHE_PATH')
+        self._ai_visual_cache = VisualCache(maxsize=_AI_CACHE_SIZE,
+                                            path=f'{cache_path}.legacy' if cache_path else None)
+        self._ai_cache_lock = threading.Lock()
+        # AI_VISUAL_STRICT forces AI visuals even where the default strategy suffices
+        self.force_ai = bool(os.getenv('AI_VISUAL_STRICT'))
+        # Turn off when the site already serves get_stylesheet() globally
+        self.embed_stylesheet = True
+        # Visuals rendered once per template for the rule-based fast path
+        self._prepared_cache: Dict[tuple, PreparedVisuals] = {}
+        # Recent AI call outcomes (True = usable visuals) for the circuit breaker
+        self._ai_outcomes = deque(maxlen=_AI_FAILURE_WINDOW)
+        self._ai_degraded_until = 0.0
         
     def enhance_content_with_visuals(self, content_html: str, template_data: Dict[str, Any], 
                                     enriched_data: Dict[str, Any]) -> str:
@@ -17,59 +740,191 @@ class AIVisualGenerator:
             # Fallback to basic visual generation if no AI
             return self._add_basic_visuals(content_html, template_data, enriched_data)
         
+        if not self.force_ai and self._default_strategy_suffices(template_data):
+            # Skip the AI round-trip for patterns the default strategy handles and
+            # reuse visuals already rendered for another page of the same template
+            prepared = self._get_prepared_visuals(template_data, enriched_data)
+            return self.enhance_prepared(content_html, prepared)
+        
         # Let AI generate contextually appropriate visuals
         enhanced_content = self._generate_ai_visuals(content_html, template_data, enriched_data)
         
         return enhanced_content
     
+    def get_stylesheet(self) -> str:
+        """<style> block with the classes used by the rule-based visuals"""
+        return _STYLESHEET
+    
+    def seed(self, value: Any) -> None:
+        """Reseed sample data generation for reproducible output"""
+        _RNG.seed(value)
+        # Rendered checklists and prepared visuals embed earlier draws, so drop them too
+        _render_checklist.cache_clear()
+        with self._ai_cache_lock:
+            self._prepared_cache.clear()
+    
+    def _default_strategy_suffices(self, template_data: Dict[str, Any]) -> bool:
+        """Whether the rule-based visuals are good enough for this template's pattern"""
+        pattern = _normalize_pattern(template_data.get('pattern', ''))
+        return any(keyword in pattern for keyword in _RULE_BASED_PATTERN_KEYWORDS)
+    
+    async def enhance_content_with_visuals_batch(self, items: List[tuple], batch_size: int = _AI_MAX_BATCH_PAGES, 
+                                                 concurrency: int = 16) -> List[str]:
+        """Enhance (content_html, template_data, enriched_data) items with packed AI requests
+        
+        The bulk counterpart of enhance_content_with_visuals. Pages that need the AI
+        are grouped by content type and sent batch_size pages per request (capped so
+        each page keeps its output token budget), with up to concurrency requests
+        in flight. Returns the enhanced HTML for every item in the same order.
+        """
+        batch_size = max(1, min(batch_size, _AI_MAX_BATCH_PAGES))
+        results: List[Any] = [None] * len(items)
+        groups: Dict[str, List[tuple]] = {}
+        use_ai = self.ai_handler.has_ai_provider() and time.monotonic() >= self._ai_degraded_until
+        
+        for i, (content_html, template_data, enriched_data) in enumerate(items):
+            if not use_ai or (not self.force_ai and self._default_strategy_suffices(template_data)):
+                # Same routing as enhance_content_with_visuals for pages that skip the AI
+                results[i] = self.enhance_content_with_visuals(content_html, template_data, enriched_data)
+                continue
+            
+            cache_key = self._visual_cache_key(content_html, template_data, enriched_data)
+            cached_html = self._ai_visual_cache.get(cache_key)
+            if cached_html:
+                results[i] = self._insert_visuals_into_content(content_html, cached_html)
+            else:
+                content_type = self._detect_content_type(template_data.get('pattern', ''), template_data)
+                groups.setdefault(content_type, []).append((i, cache_key))
+        
+        # Pages of one content type share a request so the guidance in the prompt fits all of them
+        batches = [
+            pending[start:start + batch_size]
+            for pending in groups.values()
+            for start in range(0, len(pending), batch_size)
+        ]
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def generate(batch: List[tuple]) -> Dict[int, str]:
+            async with semaphore:
+                # AIHandler is blocking, so each request runs in a worker thread
+                return await asyncio.to_thread(self._generate_ai_visuals_batch, items, batch)
+        
+        for batch_visuals in await asyncio.gather(*(generate(batch) for batch in batches)):
+            for i, visual_html in batch_visuals.items():
+                results[i] = self._insert_visuals_into_content(items[i][0], visual_html)
+        
+        # Pages the AI did not cover fall back to basic visuals
+        return [
+            html if html is not None else self._add_basic_visuals(*item)
+            for html, item in zip(results, items)
+        ]
+    
+    def _generate_ai_visuals_batch(self, items: List[tuple], batch: List[tuple]) -> Dict[int, str]:
+        """Request visuals for several pages at once; returns item index -> visual HTML"""
+        item_sections = '\n\n'.join(
+            f"<<ITEM i={i}>>\n"
+            f"CONTENT:\n{items[i][0][:_PROMPT_CONTENT_CHARS]}...\n"
+            f"VARIABLES: {_compact_json(_prompt_variables(items[i][1]))}\n"
+            f"DATA: {_compact_json(items[i][2].get('primary_data', {}))}\n"
+            f"<<END>>"
+            for i, _ in batch
+        )
+        prompt = f"""Generate 2-3 HTML visual elements (inline CSS, HTML only) for EACH blog post below, using the data provided.
+
+Return ONLY a JSON object in this exact format, with one entry per item:
+{{"visuals": [{{"i": <item number>, "html": "<visual elements HTML>"}}]}}
+
+Match the content type: comparisons -> comparison table or pros/cons; how-to -> steps or checklist; services -> provider list or pricing table; investment -> data table or market stats.
+
+{item_sections}"""
+        
+        try:
+            response = self.ai_handler.generate(prompt, max_tokens=_AI_TOKENS_PER_PAGE * len(batch))
+        except (ValueError, KeyError, OSError) as e:
+            # Malformed provider responses and network/timeout errors
+            print(f"AI batch visual generation error: {str(e)}")
+            response = None
+        
+        batch_visuals = _parse_batch_visuals(response) if response else {}
+        visuals = {}
+        for i, cache_key in batch:
+            visual_html = batch_visuals.get(i)
+            self._record_ai_outcome(bool(visual_html))
+            if visual_html:
+                self._ai_visual_cache.set(cache_key, visual_html)
+                visuals[i] = visual_html
+        return visuals
+    
     def _generate_ai_visuals(self, content_html: str, template_data: Dict[str, Any], 
                              enriched_data: Dict[str, Any]) -> str:
         """Let AI generate contextually appropriate visual elements"""
         
-        # Prepare comprehensive context for AI
-        prompt = f"""You are enhancing a blog post with visual elements. Based on the content and context, generate 2-3 HTML visual elements that would enhance reader understanding and engagement.
+        if time.monotonic() < self._ai_degraded_until:
+            # AI provider keeps failing, don't pay for calls that won't be used
+            return self._add_basic_visuals(content_html, template_data, enriched_data)
+        
+        # Pages with the same template, data and opening content reuse the earlier AI
+        # response; checked before building the prompt so hits skip that work too
+        cache_key = self._visual_cache_key(content_html, template_data, enriched_data)
+        cached_html = self._ai_visual_cache.get(cache_key)
+        if cached_html:
+            return self._insert_visuals_into_content(content_html, cached_html)
+        
+        # Prepare compact context for AI; title and pattern are already in the variables
+        prompt = f"""Generate 2-3 HTML visual elements (inline CSS, HTML only) that enhance this blog post, using the data provided.
 
 CONTENT:
-{content_html[:1000]}...
-
-CONTEXT:
-- Title: {template_data.get('title', '')}
-- Pattern: {template_data.get('pattern', '')}
-- Variables: {json.dumps(template_data, indent=2)}
-
-AVAILABLE DATA:
-{json.dumps(enriched_data.get('primary_data', {}), indent=2)}
-
-INSTRUCTIONS:
-1. Analyze the content type and topic
-2. Create 2-3 visual elements that enhance understanding
-3. Use the actual data provided above
-4. Return ONLY the HTML for the visual elements
-5. Use inline CSS for styling
-6. Make visuals that match the specific content (e.g., comparison table for "X vs Y", ROI calculator for investment content, provider list for services)
+{content_html[:_PROMPT_CONTENT_CHARS]}...
 
-IMPORTANT:
-- For comparisons: Create comparison tables, pros/cons lists, feature differences
-- For how-to: Create step-by-step guides, process flows, checklists
-- For services: Create provider lists, pricing tables, feature comparisons
-- For analysis/investment: Create data tables, ROI calculators, market stats
+VARIABLES: {_compact_json(_prompt_variables(template_data))}
+DATA: {_compact_json(enriched_data.get('primary_data', {}))}
 
-Generate the HTML visual elements that best match this specific content:"""
+Match the content type: comparisons -> comparison table or pros/cons; how-to -> steps or checklist; services -> provider list or pricing table; investment -> data table or market stats."""
 
         try:
             # Generate visuals with AI
-            visual_html = self.ai_handler.generate_content(prompt, max_tokens=1500)
-            
-            if visual_html:
-                # Insert visuals into content at appropriate positions
-                return self._insert_visuals_into_content(content_html, visual_html)
-            
-        except Exception as e:
+            visual_html = self.ai_handler.generate(prompt, max_tokens=_AI_TOKENS_PER_PAGE)
+        except (ValueError, KeyError, OSError) as e:
+            # Malformed provider responses and network/timeout errors
             print(f"AI visual generation error: {str(e)}")
+            visual_html = None
+        
+        self._record_ai_outcome(bool(visual_html))
+        
+        if visual_html:
+            self._ai_visual_cache.set(cache_key, visual_html)
+            
+            # Insert visuals into content at appropriate positions
+            return self._insert_visuals_into_content(content_html, visual_html)
         
         # Fallback to basic visuals
         return self._add_basic_visuals(content_html, template_data, enriched_data)
     
+    def _visual_cache_key(self, content_html: str, template_data: Dict[str, Any], 
+                          enriched_data: Dict[str, Any]) -> str:
+        """Key on what the AI visuals depend on rather than the full prompt text"""
+        pattern = template_data.get('pattern', '')
+        payload = '\n'.join((
+            pattern,
+            self._detect_content_type(pattern, template_data),
+            # The prompt's variables (title, City, Service...) so pages never share another's visuals
+            _compact_json(_prompt_variables(template_data)),
+            json.dumps(enriched_data.get('primary_data', {}), sort_keys=True, default=str),
+            content_html[:_PROMPT_CONTENT_CHARS]
+        ))
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _record_ai_outcome(self, succeeded: bool) -> None:
+        """Track AI call results and open the circuit when most recent calls failed"""
+        with self._ai_cache_lock:
+            self._ai_outcomes.append(succeeded)
+            failures = self._ai_outcomes.count(False)
+            if failures > _AI_FAILURE_WINDOW * _AI_FAILURE_RATIO:
+                print(f"AI visual generation degraded ({failures} of last {len(self._ai_outcomes)} calls failed), "
+                      f"using basic visuals for {_AI_COOLDOWN_SECONDS:.0f}s")
+                self._ai_degraded_until = time.monotonic() + _AI_COOLDOWN_SECONDS
+                self._ai_outcomes.clear()
+    
     def _insert_visuals_into_content(self, content_html: str, visual_html: str) -> str:
         """Insert AI-generated visuals at strategic points in content"""
         
@@ -79,298 +934,105 @@ Generate the HTML visual elements that best match this specific content:"""
         if not visuals:
             return content_html
         
-        # Split content by paragraphs
-        sections = content_html.split('</p>')
+        # Locate paragraph ends instead of splitting the whole document
+        paragraph_ends = _paragraph_ends(content_html)
+        section_count = len(paragraph_ends) + 1
         
         # Insert visuals at strategic positions
-        if len(visuals) >= 1 and len(sections) > 1:
+        inserts = []
+        if len(visuals) >= 1 and section_count > 1:
             # First visual after intro paragraph
-            sections[0] += '</p>' + visuals[0]
+            inserts.append((paragraph_ends[0], visuals[0]))
         
-        if len(visuals) >= 2 and len(sections) > 3:
+        if len(visuals) >= 2 and section_count > 3:
             # Second visual in middle of content
-            mid_point = len(sections) // 2
-            sections[mid_point] += '</p>' + visuals[1]
+            inserts.append((paragraph_ends[section_count // 2], visuals[1]))
         
-        if len(visuals) >= 3 and len(sections) > 4:
+        if len(visuals) >= 3 and section_count > 4:
             # Third visual before conclusion
-            sections[-2] += '</p>' + visuals[2]
+            inserts.append((paragraph_ends[-1], visuals[2]))
         
-        return ''.join(sections)
+        return _splice(content_html, inserts)
     
     def _parse_visual_elements(self, visual_html: str) -> List[str]:
         """Parse individual visual elements from AI response"""
-        visuals = []
-        
-        # Try to split by common visual container patterns
-        if '<div' in visual_html:
-            # Split by top-level divs
-            parts = visual_html.split('<div')
-            for i, part in enumerate(parts[1:], 1):
-                if part.strip():
-                    visual = '<div' + part
-                    # Find the matching closing div
-                    div_count = 1
-                    pos = 0
-                    while div_count > 0 and pos < len(visual):
-                        if visual[pos:pos+5] == '<div':
-                            div_count += 1
-                            pos += 5
-                        elif visual[pos:pos+6] == '</div>':
-                            div_count -= 1
-                            pos += 6
-                            if div_count == 0:
-                                visuals.append(visual[:pos])
-                                break
-                        else:
-                            pos += 1
-        
-        # If no divs found, try tables
-        elif '<table' in visual_html:
-            tables = visual_html.split('<table')
-            for table in tables[1:]:
-                if '</table>' in table:
-                    end_pos = table.find('</table>') + 8
-                    visuals.append('<table' + table[:end_pos])
-        
-        # If still no visuals, treat entire response as one visual
+        visuals = _scan_visual_elements(visual_html)
+        
+        # If no visuals found, treat entire response as one visual
         if not visuals and visual_html.strip():
             visuals = [visual_html]
         
         return visuals[:3]  # Max 3 visuals
     
-    def _get_default_visual_strategy(self, template_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Default visual strategy based on template type"""
-        pattern = template_data.get('pattern', '').lower()
+    def _get_default_visual_strategy(self, template_data: Dict[str, Any]) -> Mapping[str, Any]:
+        """Default visual strategy based on template type
         
-        # Detect content type more accurately
-        content_type = self._detect_content_type(pattern, template_data)
-        
-        # Return content-type-specific visual strategy
-        if content_type == 'comparison':
-            return {
-                'intro_visual': {'type': 'comparison_cards', 'title': 'Quick Comparison', 'focus': 'features'},
-                'main_visual': {'type': 'comparison_table', 'title': 'Detailed Comparison', 'columns': ['Feature', 'Option 1', 'Option 2']},
-                'support_visual': {'type': 'benefits_grid', 'title': 'Key Differences', 'items': 4}
-            }
-        elif content_type == 'how_to':
-            return {
-                'intro_visual': {'type': 'process_steps', 'title': 'Steps Overview', 'focus': 'process'},
-                'main_visual': {'type': 'checklist', 'title': 'Requirements Checklist', 'items': 6},
-                'support_visual': {'type': 'quick_facts', 'title': 'Tips & Best Practices', 'focus': 'tips'}
-            }
-        elif content_type == 'investment':
-            return {
-                'intro_visual': {'type': 'stats_box', 'title': 'Investment Overview', 'focus': 'roi'},
-                'main_visual': {'type': 'pricing_tiers', 'title': 'Revenue Breakdown', 'columns': ['Basic', 'Standard', 'Premium']},
-                'support_visual': {'type': 'rating_chart', 'title': 'Market Performance', 'focus': 'performance'}
-            }
-        elif content_type == 'location_service':
-            return {
-                'intro_visual': {'type': 'stats_box', 'title': 'Quick Stats', 'focus': 'providers'},
-                'main_visual': {'type': 'comparison_table', 'title': 'Top Providers', 'columns': ['Provider', 'Rating', 'Price']},
-                'support_visual': {'type': 'checklist', 'title': 'What to Expect', 'items': 6}
-            }
-        elif content_type == 'product':
-            return {
-                'intro_visual': {'type': 'pricing_tiers', 'title': 'Pricing Options', 'focus': 'pricing'},
-                'main_visual': {'type': 'comparison_cards', 'title': 'Product Features', 'columns': []},
-                'support_visual': {'type': 'rating_chart', 'title': 'Customer Reviews', 'focus': 'satisfaction'}
-            }
-        else:
-            # Generic fallback
-            return {
-                'intro_visual': {'type': 'quick_facts', 'title': 'Key Information', 'focus': 'general'},
-                'main_visual': {'type': 'comparison_cards', 'title': 'Options Available', 'columns': []},
-                'support_visual': {'type': 'benefits_grid', 'title': 'Key Benefits', 'items': 4}
-            }
+        The returned mapping is shared between pages and read-only; copy it
+        before making any page-specific changes.
+        """
+        return _default_strategy(_normalize_pattern(template_data.get('pattern', '')))
     
     def _detect_content_type(self, pattern: str, template_data: Dict[str, Any]) -> str:
         """Detect the type of content based on pattern and data"""
-        pattern_lower = pattern.lower()
-        
-        # Check for comparison content first (most specific)
-        if ' vs ' in pattern_lower or ' versus ' in pattern_lower or 'comparison' in pattern_lower:
-            return 'comparison'
-        
-        # Check for how-to content
-        if pattern_lower.startswith('how to') or 'guide' in pattern_lower or 'tutorial' in pattern_lower:
-            return 'how_to'
-        
-        # Check for investment/ROI content
-        if any(word in pattern_lower for word in ['investment', 'profitable', 'roi', 'return', 'income', 'revenue']):
-            return 'investment'
-        
-        # Check for product content (with product names or price focus)
-        product_indicators = ['iphone', 'samsung', 'laptop', 'camera', 'phone', 'tablet', 'gadget']
-        if (any(word in pattern_lower for word in product_indicators) and 
-            any(word in pattern_lower for word in ['price', 'cost', 'buy', 'purchase'])):
-            return 'product'
-        
-        # Check for location-based service - look for service words + location indicators
-        location_indicators = ['in ', 'near', 'local', ' at ']
-        service_words = ['plumber', 'electrician', 'contractor', 'repair', 'service', 'provider', 
-                        'lawyer', 'doctor', 'dentist', 'restaurant', 'shop', 'store', 'company', 'companies']
-        
-        has_location = any(indicator in pattern_lower for indicator in location_indicators)
-        has_service = any(word in pattern_lower for word in service_words)
-        
-        if has_location and (has_service or 'best' in pattern_lower):
-            return 'location_service'
-        
-        # Generic product check (fallback)
-        if any(word in pattern_lower for word in ['product', 'buy', 'purchase', 'shop', 'price', 'cost']):
-            return 'product'
-        
-        # Default to generic
-        return 'generic'
+        return _classify_pattern(_normalize_pattern(pattern))
     
     def _generate_visual_element(self, visual_spec: Dict[str, Any], 
                                 template_data: Dict[str, Any], 
-                                enriched_data: Dict[str, Any]) -> str:
-        """Generate HTML for a specific visual element"""
+                                enriched_data: Dict[str, Any],
+                                content_type: Optional[str] = None) -> str:
+        """Generate HTML for a specific visual element
+        
+        content_type is detected from the pattern when the caller hasn't
+        already done so.
+        """
         
         visual_type = visual_spec.get('type', 'stats_box')
         primary_data = enriched_data.get('primary_data', {})
         
-        if visual_type == 'stats_box':
-            return self._generate_stats_box(visual_spec, template_data, primary_data)
-        elif visual_type == 'comparison_table':
-            return self._generate_comparison_table(visual_spec, template_data, primary_data)
-        elif visual_type == 'pricing_tiers':
-            return self._generate_pricing_tiers(visual_spec, template_data, primary_data)
-        elif visual_type == 'checklist':
-            return self._generate_checklist(visual_spec, template_data, primary_data)
-        elif visual_type == 'rating_chart':
-            return self._generate_rating_chart(visual_spec, template_data, primary_data)
-        elif visual_type == 'process_steps':
-            return self._generate_process_steps(visual_spec, template_data, primary_data)
-        else:
-            return self._generate_generic_visual(visual_spec, template_data, primary_data)
+        generate = self._VISUAL_BUILDERS.get(visual_type, AIVisualGenerator._generate_generic_visual)
+        return generate(self, visual_spec, template_data, primary_data, content_type)
     
     def _generate_stats_box(self, spec: Dict[str, Any], template_data: Dict[str, Any], 
-                           primary_data: Dict[str, Any]) -> str:
+                           primary_data: Dict[str, Any], content_type: Optional[str] = None) -> str:
         """Generate a statistics info box"""
         title = spec.get('title', 'Quick Stats')
         focus = spec.get('focus', 'general')
-        pattern = template_data.get('pattern', '').lower()
         
         # Detect content type for better stat selection
-        content_type = self._detect_content_type(pattern, template_data)
+        if content_type is None:
+            content_type = self._detect_content_type(template_data.get('pattern', ''), template_data)
         
         # Select stats based on content type and focus
-        stats = []
-        if content_type == 'comparison':
-            # For comparisons, show differentiating stats
-            stats = [
-                ('Price Difference', f"${abs(primary_data.get('price_diff', 50))}", '#3b82f6'),
-                ('Feature Count', f"{primary_data.get('feature_count_1', 12)} vs {primary_data.get('feature_count_2', 10)}", '#10b981'),
-                ('User Rating', f"{primary_data.get('rating_1', 4.5)}★ vs {primary_data.get('rating_2', 4.3)}★", '#8b5cf6'),
-                ('Market Share', f"{primary_data.get('market_share_1', 35)}% vs {primary_data.get('market_share_2', 28)}%", '#f59e0b')
-            ]
-        elif content_type == 'how_to':
-            # For how-to content, show process stats
-            stats = [
-                ('Time Required', primary_data.get('time_required', '30 mins'), '#3b82f6'),
-                ('Difficulty', primary_data.get('difficulty', 'Beginner'), '#10b981'),
-                ('Steps', primary_data.get('step_count', 5), '#8b5cf6'),
-                ('Success Rate', f"{primary_data.get('success_rate', 92)}%", '#f59e0b')
-            ]
-        elif focus == 'providers' or content_type == 'location_service':
-            stats = [
-                ('Providers', primary_data.get('provider_count', 45), '#3b82f6'),
-                ('Avg Rating', f"{primary_data.get('average_rating', 4.5)}★", '#10b981'),
-                ('Price Range', f"${primary_data.get('min_price', 95)}-${primary_data.get('max_price', 350)}", '#8b5cf6'),
-                ('Response', primary_data.get('average_response_time', '2-4 hrs'), '#f59e0b')
-            ]
-        elif focus == 'roi' or content_type == 'investment':
-            stats = [
-                ('ROI', f"{primary_data.get('roi_percentage', 15)}%", '#10b981'),
-                ('Occupancy', f"{primary_data.get('occupancy_rate', 68)}%", '#3b82f6'),
-                ('Nightly Rate', f"${primary_data.get('average_nightly_rate', 127)}", '#8b5cf6'),
-                ('Listings', primary_data.get('total_listings', 342), '#f59e0b')
-            ]
-        elif content_type == 'product':
-            stats = [
-                ('Starting Price', f"${primary_data.get('min_price', 29)}", '#3b82f6'),
-                ('Avg Rating', f"{primary_data.get('average_rating', 4.4)}★", '#10b981'),
-                ('In Stock', f"{primary_data.get('stock_count', 127)} units", '#8b5cf6'),
-                ('Ships In', primary_data.get('shipping_time', '2-3 days'), '#f59e0b')
-            ]
-        else:
-            # Generic stats
-            stats = [
-                ('Options', primary_data.get('count', 50), '#3b82f6'),
-                ('Rating', f"{primary_data.get('rating', 4.5)}★", '#10b981'),
-                ('Availability', f"{primary_data.get('availability', 85)}%", '#8b5cf6'),
-                ('Updated', 'Recently', '#f59e0b')
-            ]
-        
-        html = f'''<div style="background: linear-gradient(135deg, #eff6ff 0%, #f3e8ff 100%); border: 2px solid #c7d2fe; padding: 1.5rem; border-radius: 0.75rem; margin: 2rem 0;">
-  <h3 style="margin: 0 0 1rem 0; color: #1e293b; font-size: 1.25rem;">📊 {title}</h3>
-  <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 1rem;">'''
-        
-        for label, value, color in stats:
-            html += f'''
-    <div style="text-align: center;">
-      <div style="font-size: 1.75rem; font-weight: bold; color: {color};">{value}</div>
-      <div style="color: #64748b; font-size: 0.875rem;">{label}</div>
-    </div>'''
+        stats = _STATS_BUILDERS[_stats_kind(content_type, focus)](primary_data)
         
-        html += '''
-  </div>
-</div>'''
-        return html
+        cells = ''.join(
+            _STATS_CELL_TMPL.format(label=label, value=value, color=color)
+            for label, value, color in stats
+        )
+        return _STATS_BOX_TMPL.format(title=title, cells=cells)
     
     def _generate_comparison_table(self, spec: Dict[str, Any], template_data: Dict[str, Any], 
-                                  primary_data: Dict[str, Any]) -> str:
+                                  primary_data: Dict[str, Any], content_type: Optional[str] = None) -> str:
         """Generate a comparison table"""
         title = spec.get('title', 'Comparison')
-        pattern = template_data.get('pattern', '').lower()
-        content_type = self._detect_content_type(pattern, template_data)
+        pattern = _normalize_pattern(template_data.get('pattern', ''))
+        if content_type is None:
+            content_type = self._detect_content_type(pattern, template_data)
         
         # Generate table based on content type
         if content_type == 'comparison':
             # Extract items being compared from pattern or data
-            import re
-            vs_match = re.search(r'(\w+)\s+vs\s+(\w+)', pattern, re.IGNORECASE)
+            vs_match = _VS_ITEMS_RE.search(pattern)
             if vs_match:
                 item1, item2 = vs_match.groups()
             else:
                 item1 = template_data.get('item1', 'Option 1')
                 item2 = template_data.get('item2', 'Option 2')
             
-            html = f'''<div style="margin: 2rem 0;">
-  <h3>{title}</h3>
-  <div style="overflow-x: auto;">
-    <table style="width: 100%; border-collapse: collapse; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
-      <thead>
-        <tr style="background: #f8fafc;">
-          <th style="padding: 0.75rem; text-align: left; border-bottom: 2px solid #e2e8f0;">Feature</th>
-          <th style="padding: 0.75rem; text-align: center; border-bottom: 2px solid #e2e8f0;">{item1}</th>
-          <th style="padding: 0.75rem; text-align: center; border-bottom: 2px solid #e2e8f0;">{item2}</th>
-        </tr>
-      </thead>
-      <tbody>'''
+            head = _FEATURE_TABLE_HEAD_TMPL.format(item1=item1, item2=item2)
             
-            # Comparison features
-            features = [
-                ('Price', f"${primary_data.get('price_1', 99)}/mo", f"${primary_data.get('price_2', 149)}/mo"),
-                ('Free Trial', '14 days', '30 days'),
-                ('User Limit', f"{primary_data.get('users_1', 5)} users", f"{primary_data.get('users_2', 'Unlimited')}"),
-                ('Storage', f"{primary_data.get('storage_1', '10GB')}", f"{primary_data.get('storage_2', '100GB')}"),
-                ('Support', '24/7 Email', '24/7 Phone & Email'),
-                ('Integration', f"{primary_data.get('integrations_1', 50)}+ apps", f"{primary_data.get('integrations_2', 200)}+ apps")
-            ]
-            
-            for i, (feature, val1, val2) in enumerate(features):
-                bg = '#ffffff' if i % 2 == 0 else '#f9fafb'
-                html += f'''
-        <tr style="background: {bg};">
-          <td style="padding: 0.75rem; border-bottom: 1px solid #e2e8f0; font-weight: 600;">{feature}</td>
-          <td style="padding: 0.75rem; text-align: center; border-bottom: 1px solid #e2e8f0;">{val1}</td>
-          <td style="padding: 0.75rem; text-align: center; border-bottom: 1px solid #e2e8f0;">{val2}</td>
-        </tr>'''
+            # Comparison features, filled into the pre-rendered rows in one pass
+            rows = _FEATURE_ROWS_TMPL.format_map(ChainMap(primary_data, _COMPARISON_TABLE_DEFAULTS))
             
         else:
             # Default provider table for services
@@ -379,258 +1041,156 @@ Generate the HTML visual elements that best match this specific content:"""
             # Get or generate provider data
             providers = primary_data.get('top_providers', [])
             if not providers:
-                import random
-                providers = []
-                for i in range(5):
-                    providers.append({
-                        'name': f'{service} Provider {i+1}',
-                        'rating': round(4.0 + random.random(), 1),
-                        'reviews': random.randint(50, 500),
-                        'price': f'${random.randint(100, 400)}',
-                        'response': f'{random.randint(1, 6)}h'
-                    })
+                providers = [
+                    dict(zip(('name', 'rating', 'reviews', 'price', 'response'), row))
+                    for row in _placeholder_providers(pattern, service)
+                ]
             
-            html = f'''<div style="margin: 2rem 0;">
-  <h3>{title}</h3>
-  <div style="overflow-x: auto;">
-    <table style="width: 100%; border-collapse: collapse; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
-      <thead>
-        <tr style="background: #f8fafc;">
-          <th style="padding: 0.75rem; text-align: left; border-bottom: 2px solid #e2e8f0;">Provider</th>
-          <th style="padding: 0.75rem; text-align: center; border-bottom: 2px solid #e2e8f0;">Rating</th>
-          <th style="padding: 0.75rem; text-align: center; border-bottom: 2px solid #e2e8f0;">Reviews</th>
-          <th style="padding: 0.75rem; text-align: center; border-bottom: 2px solid #e2e8f0;">Est. Price</th>
-          <th style="padding: 0.75rem; text-align: center; border-bottom: 2px solid #e2e8f0;">Response</th>
-        </tr>
-      </thead>
-      <tbody>'''
-            
-            for i, provider in enumerate(providers[:5]):
-                bg = '#ffffff' if i % 2 == 0 else '#f9fafb'
-                html += f'''
-        <tr style="background: {bg};">
-          <td style="padding: 0.75rem; border-bottom: 1px solid #e2e8f0; font-weight: 600;">{provider.get('name')}</td>
-          <td style="padding: 0.75rem; text-align: center; border-bottom: 1px solid #e2e8f0; color: #10b981; font-weight: bold;">{provider.get('rating')}★</td>
-          <td style="padding: 0.75rem; text-align: center; border-bottom: 1px solid #e2e8f0;">{provider.get('reviews')}</td>
-          <td style="padding: 0.75rem; text-align: center; border-bottom: 1px solid #e2e8f0; font-weight: 600;">{provider.get('price')}</td>
-          <td style="padding: 0.75rem; text-align: center; border-bottom: 1px solid #e2e8f0;">{provider.get('response')}</td>
-        </tr>'''
+            head = _PROVIDER_TABLE_HEAD
+            rows = ''.join(
+                _PROVIDER_ROW_TMPL.format(name=provider.get('name'), rating=provider.get('rating'),
+                                          reviews=provider.get('reviews'), price=provider.get('price'),
+                                          response=provider.get('response'))
+                for provider in providers[:5]
+            )
         
-        html += '''
-      </tbody>
-    </table>
-  </div>
-</div>'''
-        return html
+        return _TABLE_TMPL.format(title=title, head=head, rows=rows)
     
     def _generate_checklist(self, spec: Dict[str, Any], template_data: Dict[str, Any], 
-                           primary_data: Dict[str, Any]) -> str:
+                           primary_data: Dict[str, Any], content_type: Optional[str] = None) -> str:
         """Generate a checklist visual"""
         title = spec.get('title', 'Key Features')
         num_items = spec.get('items', 6)
         
-        # Generate contextual checklist items
         service = template_data.get('Service', 'service')
-        items = self._get_contextual_checklist_items(service, num_items)
         
-        html = f'''<div style="margin: 2rem 0;">
-  <h3>{title}</h3>
-  <div style="background: #f9fafb; padding: 1.5rem; border-radius: 0.5rem;">
-    <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 0.75rem;">'''
-        
-        for item, included in items:
-            icon = '✅' if included else '❌'
-            color = '#10b981' if included else '#94a3b8'
-            html += f'''
-      <div style="display: flex; align-items: center;">
-        <span style="font-size: 1.25rem; margin-right: 0.5rem;">{icon}</span>
-        <span style="color: {color};">{item}</span>
-      </div>'''
-        
-        html += '''
-    </div>
-  </div>
-</div>'''
-        return html
+        # Identical for every page of a service, so rendered once and reused
+        return _render_checklist(title, service.lower(), num_items)
     
     def _get_contextual_checklist_items(self, service: str, num_items: int) -> List[tuple]:
         """Get context-appropriate checklist items"""
-        import random
-        
-        # Common features for services
-        all_features = [
-            ('Licensed & Insured', True),
-            ('Free Estimates', True),
-            ('24/7 Emergency Service', True),
-            ('Warranty Included', True),
-            ('Online Booking', random.choice([True, False])),
-            ('Same-Day Service', random.choice([True, False])),
-            ('Senior Discounts', True),
-            ('Eco-Friendly Options', random.choice([True, False])),
-            ('Payment Plans', random.choice([True, False])),
-            ('Mobile Service', random.choice([True, False]))
-        ]
-        
-        # Select requested number of items
-        return all_features[:num_items]
+        return _contextual_checklist_items(service, num_items)
     
     def _generate_pricing_tiers(self, spec: Dict[str, Any], template_data: Dict[str, Any], 
-                               primary_data: Dict[str, Any]) -> str:
+                               primary_data: Dict[str, Any], content_type: Optional[str] = None) -> str:
         """Generate pricing tier cards"""
         title = spec.get('title', 'Pricing Options')
         min_price = primary_data.get('min_price', 100)
         max_price = primary_data.get('max_price', 500)
-        mid_price = (min_price + max_price) // 2
         
-        html = f'''<div style="margin: 2rem 0;">
-  <h3>{title}</h3>
-  <div style="display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem;">
-    <div style="background: #f3f4f6; padding: 1.5rem; border-radius: 0.5rem; text-align: center;">
-      <h4 style="color: #6b7280; margin: 0 0 0.5rem 0;">Basic</h4>
-      <div style="font-size: 2rem; font-weight: bold; color: #1f2937;">${min_price}</div>
-      <ul style="list-style: none; padding: 0; margin: 1rem 0 0 0; text-align: left; font-size: 0.875rem; color: #6b7280;">
-        <li>• Standard service</li>
-        <li>• 30-day warranty</li>
-        <li>• Business hours</li>
-      </ul>
-    </div>
-    <div style="background: linear-gradient(135deg, #e0e7ff 0%, #c7d2fe 100%); padding: 1.5rem; border-radius: 0.5rem; text-align: center; border: 2px solid #6366f1;">
-      <h4 style="color: #4f46e5; margin: 0 0 0.5rem 0;">Popular</h4>
-      <div style="font-size: 2rem; font-weight: bold; color: #4f46e5;">${mid_price}</div>
-      <ul style="list-style: none; padding: 0; margin: 1rem 0 0 0; text-align: left; font-size: 0.875rem; color: #4f46e5;">
-        <li>• Priority service</li>
-        <li>• 90-day warranty</li>
-        <li>• Extended hours</li>
-      </ul>
-    </div>
-    <div style="background: #fef3c7; padding: 1.5rem; border-radius: 0.5rem; text-align: center;">
-      <h4 style="color: #92400e; margin: 0 0 0.5rem 0;">Premium</h4>
-      <div style="font-size: 2rem; font-weight: bold; color: #92400e;">${max_price}+</div>
-      <ul style="list-style: none; padding: 0; margin: 1rem 0 0 0; text-align: left; font-size: 0.875rem; color: #92400e;">
-        <li>• VIP service</li>
-        <li>• 1-year warranty</li>
-        <li>• 24/7 availability</li>
-      </ul>
-    </div>
-  </div>
-</div>'''
-        return html
+        return _render_pricing_tiers(title, min_price, max_price)
     
     def _generate_rating_chart(self, spec: Dict[str, Any], template_data: Dict[str, Any], 
-                              primary_data: Dict[str, Any]) -> str:
+                              primary_data: Dict[str, Any], content_type: Optional[str] = None) -> str:
         """Generate a visual rating breakdown"""
-        import random
         avg_rating = primary_data.get('average_rating', 4.5)
         
-        # Generate rating distribution
-        ratings = {
-            5: random.randint(60, 75),
-            4: random.randint(15, 25),
-            3: random.randint(5, 10),
-            2: random.randint(1, 3),
-            1: random.randint(0, 2)
-        }
-        
-        # Normalize
-        total = sum(ratings.values())
-        ratings = {k: int(v * 100 / total) for k, v in ratings.items()}
-        
-        html = f'''<div style="margin: 2rem 0;">
-  <h3>Customer Satisfaction</h3>
-  <div style="background: #f9fafb; padding: 1.5rem; border-radius: 0.5rem;">
-    <div style="text-align: center; margin-bottom: 1.5rem;">
-      <div style="font-size: 2.5rem; font-weight: bold; color: #10b981;">{avg_rating}★</div>
-      <div style="color: #64748b;">Average Rating</div>
-    </div>'''
+        # Normalized rating distribution, shared by pages of the same template
+        distribution = _placeholder_rating_distribution(_normalize_pattern(template_data.get('pattern', '')))
         
-        for stars in range(5, 0, -1):
-            pct = ratings[stars]
-            color = '#10b981' if stars >= 4 else '#f59e0b' if stars == 3 else '#ef4444'
-            html += f'''
-    <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
-      <span style="width: 3rem; color: #64748b;">{stars}★</span>
-      <div style="flex: 1; height: 1.5rem; background: #e5e7eb; border-radius: 0.25rem; margin: 0 0.5rem;">
-        <div style="width: {pct}%; height: 100%; background: {color}; border-radius: 0.25rem;"></div>
-      </div>
-      <span style="width: 3rem; text-align: right; color: #64748b;">{pct}%</span>
-    </div>'''
-        
-        html += '''
-  </div>
-</div>'''
-        return html
+        pct5, pct4, pct3, pct2, pct1 = distribution
+        return _RATING_CHART_FULL_TMPL.format(avg_rating=avg_rating, pct5=pct5, pct4=pct4,
+                                              pct3=pct3, pct2=pct2, pct1=pct1)
     
     def _generate_process_steps(self, spec: Dict[str, Any], template_data: Dict[str, Any], 
-                               primary_data: Dict[str, Any]) -> str:
+                               primary_data: Dict[str, Any], content_type: Optional[str] = None) -> str:
         """Generate process steps visualization"""
         title = spec.get('title', 'How It Works')
         service = template_data.get('Service', 'Service')
         
-        steps = [
-            ('Contact', f'Reach out for {service.lower()} consultation'),
-            ('Quote', 'Receive detailed estimate'),
-            ('Schedule', 'Book convenient appointment'),
-            ('Service', 'Professional work completed'),
-            ('Follow-up', 'Satisfaction guaranteed')
-        ]
-        
-        html = f'''<div style="margin: 2rem 0;">
-  <h3>{title}</h3>
-  <div style="display: flex; justify-content: space-between; align-items: center; flex-wrap: wrap;">'''
-        
-        for i, (step, desc) in enumerate(steps):
-            html += f'''
-    <div style="text-align: center; flex: 1; min-width: 120px; margin: 0.5rem;">
-      <div style="width: 3rem; height: 3rem; background: #6366f1; color: white; border-radius: 50%; display: flex; align-items: center; justify-content: center; margin: 0 auto 0.5rem; font-weight: bold;">
-        {i + 1}
-      </div>
-      <div style="font-weight: 600; color: #1e293b;">{step}</div>
-      <div style="font-size: 0.75rem; color: #64748b; margin-top: 0.25rem;">{desc}</div>
-    </div>'''
-            
-            if i < len(steps) - 1:
-                html += '''
-    <div style="color: #cbd5e1; font-size: 1.5rem;">→</div>'''
-        
-        html += '''
-  </div>
-</div>'''
-        return html
+        return _render_process_steps(title, service.lower())
     
     def _generate_generic_visual(self, spec: Dict[str, Any], template_data: Dict[str, Any], 
-                                primary_data: Dict[str, Any]) -> str:
+                                primary_data: Dict[str, Any], content_type: Optional[str] = None) -> str:
         """Fallback generic visual element"""
-        return self._generate_stats_box(spec, template_data, primary_data)
+        return self._generate_stats_box(spec, template_data, primary_data, content_type)
     
-    def _add_basic_visuals(self, content_html: str, template_data: Dict[str, Any], 
-                          enriched_data: Dict[str, Any]) -> str:
-        """Add basic visuals without AI"""
-        # Get default visual strategy based on template
-        visual_strategy = self._get_default_visual_strategy(template_data)
+    def prepare_template(self, template_data: Dict[str, Any], 
+                         enriched_data: Dict[str, Any]) -> PreparedVisuals:
+        """Render the basic visuals once for all pages of a template
         
-        # Split content by paragraphs
-        sections = content_html.split('</p>')
+        The builders only read the pattern, Service, item names and primary_data,
+        so the result can be reused through enhance_prepared for every page that
+        shares those, whatever its other variables (such as City).
+        """
+        return self._prepare_visuals(template_data, enriched_data)
+    
+    def enhance_prepared(self, content_html: str, prepared: PreparedVisuals) -> str:
+        """Insert prepared visuals into one page"""
+        # Locate paragraph ends instead of splitting the whole document
+        paragraph_ends = _paragraph_ends(content_html)
+        section_count = len(paragraph_ends) + 1
+        inserts = []
         
         # Add intro visual after first paragraph
-        if len(sections) > 1 and visual_strategy.get('intro_visual'):
-            intro_visual = self._generate_visual_element(
-                visual_strategy['intro_visual'], template_data, enriched_data
-            )
-            sections[0] += '</p>' + intro_visual
+        if section_count > 1 and prepared.intro_html:
+            inserts.append((paragraph_ends[0], prepared.intro_html))
         
         # Add main visual after second paragraph
-        if len(sections) > 2 and visual_strategy.get('main_visual'):
-            main_visual = self._generate_visual_element(
-                visual_strategy['main_visual'], template_data, enriched_data
-            )
-            sections[1] += '</p>' + main_visual
+        if section_count > 2 and prepared.main_html:
+            inserts.append((paragraph_ends[1], prepared.main_html))
         
-        # Add support visual before last paragraph
-        if len(sections) > 3 and visual_strategy.get('support_visual'):
-            support_visual = self._generate_visual_element(
-                visual_strategy['support_visual'], template_data, enriched_data
-            )
-            # Insert before the last paragraph (before CTA)
-            sections[-2] += '</p>' + support_visual
+        # Add support visual before last paragraph (before CTA)
+        if section_count > 3 and prepared.support_html:
+            inserts.append((paragraph_ends[-1], prepared.support_html))
         
-        return ''.join(sections)
\ No newline at end of file
+        if inserts and self.embed_stylesheet:
+            # Visuals only carry class names, so ship their stylesheet once with the first one
+            offset, first_visual = inserts[0]
+            inserts[0] = (offset, _STYLESHEET + first_visual)
+        
+        return _splice(content_html, inserts)
+    
+    def _get_prepared_visuals(self, template_data: Dict[str, Any], 
+                              enriched_data: Dict[str, Any]) -> PreparedVisuals:
+        """Prepared visuals for this page's template, rendered on first use"""
+        # Basic visuals only read the pattern, Service, item names and a few primary data fields
+        primary_data = enriched_data.get('primary_data', {})
+        key = (
+            template_data.get('pattern', ''), template_data.get('Service', ''),
+            template_data.get('item1', ''), template_data.get('item2', ''),
+            json.dumps({field: primary_data[field] for field in _VISUAL_DATA_FIELDS.intersection(primary_data)},
+                       sort_keys=True, default=str)
+        )
+        with self._ai_cache_lock:
+            prepared = self._prepared_cache.get(key)
+        if prepared is None:
+            prepared = self.prepare_template(template_data, enriched_data)
+            with self._ai_cache_lock:
+                if len(self._prepared_cache) >= _PREPARED_CACHE_SIZE:
+                    # Evict the oldest entry (dicts keep insertion order)
+                    del self._prepared_cache[next(iter(self._prepared_cache))]
+                self._prepared_cache[key] = prepared
+        return prepared
+    
+    def _prepare_visuals(self, template_data: Dict[str, Any], 
+                         enriched_data: Dict[str, Any]) -> PreparedVisuals:
+        """Render the intro, main and support visuals of the default strategy"""
+        # Get default visual strategy based on template
+        visual_strategy = self._get_default_visual_strategy(template_data)
+        # Classified once here instead of again by every builder that needs it
+        content_type = self._detect_content_type(template_data.get('pattern', ''), template_data)
+        rendered = {}
+        for slot in ('intro_visual', 'main_visual', 'support_visual'):
+            spec = visual_strategy.get(slot)
+            rendered[slot] = (
+                self._generate_visual_element(spec, template_data, enriched_data, content_type) if spec else ''
+            )
+        return PreparedVisuals(rendered['intro_visual'], rendered['main_visual'], rendered['support_visual'])
+    
+    def _add_basic_visuals(self, content_html: str, template_data: Dict[str, Any], 
+                          enriched_data: Dict[str, Any]) -> str:
+        """Add basic visuals without AI"""
+        prepared = self._get_prepared_visuals(template_data, enriched_data)
+        return self.enhance_prepared(content_html, prepared)
+    
+    # Visual type -> builder, looked up once per element instead of an if/elif chain
+    _VISUAL_BUILDERS = {
+        'stats_box': _generate_stats_box,
+        'comparison_table': _generate_comparison_table,
+        'pricing_tiers': _generate_pricing_tiers,
+        'checklist': _generate_checklist,
+        'rating_chart': _generate_rating_chart,
+        'process_steps': _generate_process_steps
+    }
+
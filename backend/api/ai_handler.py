@@ -28,7 +28,18 @@ class AIHandler:
         """Check if at least one AI provider is configured"""
         return bool(self.openai_key or self.anthropic_key or self.perplexity_key)
     
-    def generate_with_openai(self, prompt, max_tokens=500):
+    def _chat_messages(self, prompt, system=None):
+        """Build chat messages, putting static instructions first for prefix caching"""
+        messages = [{'role': 'user', 'content': prompt}]
+        if system:
+            messages.insert(0, {'role': 'system', 'content': system})
+        return messages
+    
+    def _anthropic_system(self, system):
+        """Anthropic system block marked for prompt caching"""
+        return [{'type': 'text', 'text': system, 'cache_control': {'type': 'ephemeral'}}]
+    
+    def generate_with_openai(self, prompt, max_tokens=500, system=None):
         """Generate content using OpenAI API"""
         if not self.openai_key:
             return None
@@ -40,7 +51,7 @@ class AIHandler:
         
         data = {
             'model': 'gpt-3.5-turbo',
-            'messages': [{'role': 'user', 'content': prompt}],
+            'messages': self._chat_messages(prompt, system),
             'max_tokens': max_tokens,
             'temperature': 0.7
         }
@@ -60,7 +71,7 @@ class AIHandler:
             traceback.print_exc()
             return None
     
-    def generate_with_anthropic(self, prompt, max_tokens=500):
+    def generate_with_anthropic(self, prompt, max_tokens=500, system=None):
         """Generate content using Anthropic API"""
         if not self.anthropic_key:
             return None
@@ -76,6 +87,8 @@ class AIHandler:
             'messages': [{'role': 'user', 'content': prompt}],
             'max_tokens': max_tokens
         }
+        if system:
+            data['system'] = self._anthropic_system(system)
         
         try:
             req = Request('https://api.anthropic.com/v1/messages',
@@ -92,7 +105,7 @@ class AIHandler:
             traceback.print_exc()
             return None
     
-    def generate_with_perplexity(self, prompt, max_tokens=500):
+    def generate_with_perplexity(self, prompt, max_tokens=500, system=None):
         """Generate content using Perplexity API"""
         if not self.perplexity_key:
             return None
@@ -104,7 +117,7 @@ class AIHandler:
         
         data = {
             'model': 'sonar',  # Simple model name
-            'messages': [{'role': 'user', 'content': prompt}],
+            'messages': self._chat_messages(prompt, system),
             'max_tokens': max_tokens,
             'temperature': 0.7
         }
@@ -130,26 +143,138 @@ class AIHandler:
             traceback.print_exc()
             return None
     
-    def generate(self, prompt, max_tokens=500):
+    def generate(self, prompt, max_tokens=500, system=None):
         """Generate content using available AI provider"""
         # Try Perplexity first (good for SEO/web research)
-        result = self.generate_with_perplexity(prompt, max_tokens)
+        result = self.generate_with_perplexity(prompt, max_tokens, system)
         if result:
             return result
             
         # Try OpenAI
-        result = self.generate_with_openai(prompt, max_tokens)
+        result = self.generate_with_openai(prompt, max_tokens, system)
         if result:
             return result
             
         # Fall back to Anthropic
-        result = self.generate_with_anthropic(prompt, max_tokens)
+        result = self.generate_with_anthropic(prompt, max_tokens, system)
         if result:
             return result
             
         # No AI provider available or all failed
         return None
 
+    def _stream_events(self, url, headers, data):
+        """Yield parsed JSON events from a server-sent events response"""
+        req = Request(url,
+                     data=json.dumps(data).encode(),
+                     headers=headers,
+                     method='POST')
+        
+        # Closing this generator early closes the HTTP connection as well
+        with urlopen(req, timeout=30) as response:
+            for raw_line in response:
+                line = raw_line.decode().strip()
+                if not line.startswith('data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == '[DONE]':
+                    break
+                yield json.loads(payload)
+    
+    def stream_with_openai(self, prompt, max_tokens=500, system=None):
+        """Stream content chunks from OpenAI API"""
+        headers = {
+            'Authorization': f'Bearer {self.openai_key}',
+            'Content-Type': 'application/json'
+        }
+        
+        data = {
+            'model': 'gpt-3.5-turbo',
+            'messages': self._chat_messages(prompt, system),
+            'max_tokens': max_tokens,
+            'temperature': 0.7,
+            'stream': True
+        }
+        
+        for event in self._stream_events('https://api.openai.com/v1/chat/completions', headers, data):
+            choices = event.get('choices') or [{}]
+            text = choices[0].get('delta', {}).get('content')
+            if text:
+                yield text
+    
+    def stream_with_anthropic(self, prompt, max_tokens=500, system=None):
+        """Stream content chunks from Anthropic API"""
+        headers = {
+            'x-api-key': self.anthropic_key,
+            'Content-Type': 'application/json',
+            'anthropic-version': '2023-06-01'
+        }
+        
+        data = {
+            'model': 'claude-3-haiku-20240307',
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': max_tokens,
+            'stream': True
+        }
+        if system:
+            data['system'] = self._anthropic_system(system)
+        
+        for event in self._stream_events('https://api.anthropic.com/v1/messages', headers, data):
+            if event.get('type') == 'content_block_delta':
+                text = event.get('delta', {}).get('text')
+                if text:
+                    yield text
+    
+    def stream_with_perplexity(self, prompt, max_tokens=500, system=None):
+        """Stream content chunks from Perplexity API"""
+        headers = {
+            'Authorization': f'Bearer {self.perplexity_key}',
+            'Content-Type': 'application/json'
+        }
+        
+        data = {
+            'model': 'sonar',
+            'messages': self._chat_messages(prompt, system),
+            'max_tokens': max_tokens,
+            'temperature': 0.7,
+            'stream': True
+        }
+        
+        for event in self._stream_events('https://api.perplexity.ai/chat/completions', headers, data):
+            choices = event.get('choices') or [{}]
+            text = choices[0].get('delta', {}).get('content')
+            if text:
+                yield text
+    
+    def generate_content_stream(self, prompt, max_tokens=500, system=None):
+        """Stream content chunks from the first available AI provider
+        
+        Providers are tried in the same order as generate(). A provider that
+        fails before producing output falls through to the next one; a failure
+        after output has been yielded is re-raised so callers never mistake the
+        partial response for a complete one.
+        """
+        providers = [
+            ('Perplexity', self.perplexity_key, self.stream_with_perplexity),
+            ('OpenAI', self.openai_key, self.stream_with_openai),
+            ('Anthropic', self.anthropic_key, self.stream_with_anthropic)
+        ]
+        
+        for name, key, stream in providers:
+            if not key:
+                continue
+            
+            started = False
+            try:
+                for chunk in stream(prompt, max_tokens, system):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                print(f"{name} streaming error: {str(e)}")
+                if started:
+                    raise
+
     def analyze_business_with_ai(self, business_info):
         """Use AI to analyze business and suggest content types"""
         if not self.has_ai_provider():
@@ -1,53 +1,99 @@
 """Content variation engine to avoid duplicate content penalties"""
 import random
 import re
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+
+# Fixed pools the engine draws from, built once instead of on every call
+_UNIQUE_ELEMENTS = (
+    "custom_infographic",
+    "data_visualization",
+    "expert_quotes",
+    "case_study",
+    "video_embed",
+    "interactive_calculator",
+    "downloadable_checklist",
+    "comparison_table",
+    "pros_cons_list",
+    "timeline",
+    "statistics_section",
+    "user_testimonials",
+    "related_tools",
+    "glossary",
+    "quick_reference_guide"
+)
+_INDUSTRIES = ("healthcare", "finance", "retail", "technology", "manufacturing")
+# Content structures for keyword types, checked in order: (substring triggers, sections)
+_STRUCTURE_TRIGGERS = (
+    (("comparison", "vs"),
+     ("introduction", "criteria", "comparison_table", "detailed_analysis", "verdict", "alternatives")),
+    (("how to",),
+     ("introduction", "requirements", "step_by_step", "tips", "troubleshooting", "conclusion")),
+    (("best", "top"),
+     ("introduction", "evaluation_criteria", "top_picks", "detailed_reviews", "comparison", "buying_guide"))
+)
+_VARIATION_TYPES = ("comprehensive", "detailed", "expert", "beginner-friendly", "technical", "practical")
 
 class ContentVariationEngine:
-    def __init__(self):
-        # Variation templates for different content types
-        self.intro_variations = [
-            "Looking for {keyword}? You've come to the right place.",
-            "If you're searching for {keyword}, this comprehensive guide covers everything you need to know.",
-            "Discover the complete guide to {keyword} with expert insights and practical tips.",
-            "{keyword} can be complex, but we've broken it down into simple, actionable steps.",
-            "Whether you're a beginner or expert, this {keyword} guide has valuable information for you."
-        ]
-        
-        self.structure_variations = [
-            ["introduction", "main_points", "examples", "conclusion", "faq"],
-            ["overview", "detailed_analysis", "case_studies", "best_practices", "summary"],
-            ["quick_answer", "in_depth_explanation", "practical_tips", "common_mistakes", "next_steps"],
-            ["executive_summary", "key_concepts", "implementation", "results", "recommendations"],
-            ["problem_statement", "solution_overview", "step_by_step", "troubleshooting", "resources"]
-        ]
-        
-        self.transition_phrases = [
-            "Furthermore,", "Additionally,", "Moreover,", "It's worth noting that",
-            "Another important aspect is", "Let's dive deeper into", "Building on this,",
-            "To expand on this point,", "Equally important is", "This brings us to"
-        ]
-        
-        self.conclusion_variations = [
-            "In conclusion, {keyword} is an important topic that requires careful consideration.",
-            "To sum up, mastering {keyword} can significantly improve your {benefit}.",
-            "Now that you understand {keyword}, you're ready to {action}.",
-            "The key takeaway about {keyword} is {main_point}.",
-            "By following these {keyword} guidelines, you'll be well on your way to success."
-        ]
+    # Variation templates for different content types, shared by every instance
+    intro_variations = (
+        "Looking for {keyword}? You've come to the right place.",
+        "If you're searching for {keyword}, this comprehensive guide covers everything you need to know.",
+        "Discover the complete guide to {keyword} with expert insights and practical tips.",
+        "{keyword} can be complex, but we've broken it down into simple, actionable steps.",
+        "Whether you're a beginner or expert, this {keyword} guide has valuable information for you."
+    )
+    
+    structure_variations = (
+        ("introduction", "main_points", "examples", "conclusion", "faq"),
+        ("overview", "detailed_analysis", "case_studies", "best_practices", "summary"),
+        ("quick_answer", "in_depth_explanation", "practical_tips", "common_mistakes", "next_steps"),
+        ("executive_summary", "key_concepts", "implementation", "results", "recommendations"),
+        ("problem_statement", "solution_overview", "step_by_step", "troubleshooting", "resources")
+    )
+    
+    transition_phrases = (
+        "Furthermore,", "Additionally,", "Moreover,", "It's worth noting that",
+        "Another important aspect is", "Let's dive deeper into", "Building on this,",
+        "To expand on this point,", "Equally important is", "This brings us to"
+    )
+    
+    conclusion_variations = (
+        "In conclusion, {keyword} is an important topic that requires careful consideration.",
+        "To sum up, mastering {keyword} can significantly improve your {benefit}.",
+        "Now that you understand {keyword}, you're ready to {action}.",
+        "The key takeaway about {keyword} is {main_point}.",
+        "By following these {keyword} guidelines, you'll be well on your way to success."
+    )
+    
+    synonyms = {
+        "important": ("crucial", "essential", "vital", "significant", "key"),
+        "help": ("assist", "aid", "support", "facilitate", "enable"),
+        "improve": ("enhance", "boost", "optimize", "strengthen", "elevate"),
+        "understand": ("comprehend", "grasp", "master", "learn", "discover"),
+        "create": ("develop", "build", "design", "establish", "generate"),
+        "use": ("utilize", "employ", "apply", "implement", "leverage"),
+        "show": ("demonstrate", "illustrate", "reveal", "display", "present"),
+        "good": ("excellent", "effective", "beneficial", "valuable", "advantageous"),
+        "many": ("numerous", "various", "multiple", "several", "diverse"),
+        "need": ("require", "demand", "necessitate", "call for", "depend on")
+    }
+    
+    # One whole-word alternation over every synonym key, so content is scanned once
+    _synonym_re = re.compile(
+        r'\b(' + '|'.join(map(re.escape, synonyms)) + r')\b', re.IGNORECASE
+    )
 
     def generate_unique_structure(self, keyword: str, content_type: str) -> Dict[str, Any]:
         """Generate a unique content structure"""
-        # Select random structure
-        structure = random.choice(self.structure_variations)
-        
-        # Add unique elements based on content type
-        if "comparison" in keyword.lower() or "vs" in keyword.lower():
-            structure = ["introduction", "criteria", "comparison_table", "detailed_analysis", "verdict", "alternatives"]
-        elif "how to" in keyword.lower():
-            structure = ["introduction", "requirements", "step_by_step", "tips", "troubleshooting", "conclusion"]
-        elif "best" in keyword.lower() or "top" in keyword.lower():
-            structure = ["introduction", "evaluation_criteria", "top_picks", "detailed_reviews", "comparison", "buying_guide"]
+        # Pick the structure for the content type, or a random one when no trigger matches
+        keyword_lower = keyword.lower()
+        structure = next((
+            list(structure) for triggers, structure in _STRUCTURE_TRIGGERS
+            if any(trigger in keyword_lower for trigger in triggers)
+        ), None)
+        if structure is None:
+            structure = list(random.choice(self.structure_variations))
         
         return {
             "structure": structure,
@@ -57,32 +103,8 @@ class ContentVariationEngine:
 
     def get_unique_elements(self, keyword: str) -> List[str]:
         """Get unique content elements to add"""
-        elements = []
-        
-        # Always add some unique elements
-        possible_elements = [
-            "custom_infographic",
-            "data_visualization",
-            "expert_quotes",
-            "case_study",
-            "video_embed",
-            "interactive_calculator",
-            "downloadable_checklist",
-            "comparison_table",
-            "pros_cons_list",
-            "timeline",
-            "statistics_section",
-            "user_testimonials",
-            "related_tools",
-            "glossary",
-            "quick_reference_guide"
-        ]
-        
         # Select 3-5 unique elements
-        num_elements = random.randint(3, 5)
-        elements = random.sample(possible_elements, num_elements)
-        
-        return elements
+        return random.sample(_UNIQUE_ELEMENTS, random.randint(3, 5))
 
     def vary_content(self, base_content: str, keyword: str, variations_needed: int = 1) -> List[Dict[str, str]]:
         """Generate content variations to avoid duplication"""
@@ -123,48 +145,37 @@ class ContentVariationEngine:
             random.shuffle(middle)
             sentences = [sentences[0]] + middle + [sentences[-1]]
         
-        # Join with varied punctuation
-        varied = '. '.join(sentences)
-        
-        # Add transition phrases
+        # Add transition phrases; they never contain '. ', so the sentence list
+        # stays valid and is joined once at the end
         for phrase in random.sample(self.transition_phrases, 3):
             # Find a good spot to insert
-            sentences = varied.split('. ')
             if len(sentences) > 2:
                 insert_pos = random.randint(1, len(sentences)-1)
                 sentences[insert_pos] = phrase + " " + sentences[insert_pos]
-                varied = '. '.join(sentences)
         
-        return varied
+        # Join with varied punctuation
+        return '. '.join(sentences)
 
     def vary_vocabulary(self, content: str) -> str:
         """Replace words with synonyms"""
-        synonyms = {
-            "important": ["crucial", "essential", "vital", "significant", "key"],
-            "help": ["assist", "aid", "support", "facilitate", "enable"],
-            "improve": ["enhance", "boost", "optimize", "strengthen", "elevate"],
-            "understand": ["comprehend", "grasp", "master", "learn", "discover"],
-            "create": ["develop", "build", "design", "establish", "generate"],
-            "use": ["utilize", "employ", "apply", "implement", "leverage"],
-            "show": ["demonstrate", "illustrate", "reveal", "display", "present"],
-            "good": ["excellent", "effective", "beneficial", "valuable", "advantageous"],
-            "many": ["numerous", "various", "multiple", "several", "diverse"],
-            "need": ["require", "demand", "necessitate", "call for", "depend on"]
-        }
-        
-        varied_content = content
-        for word, alternatives in synonyms.items():
-            if word in varied_content.lower():
-                replacement = random.choice(alternatives)
-                # Replace with proper case
-                varied_content = re.sub(
-                    r'\b' + word + r'\b',
-                    replacement,
-                    varied_content,
-                    flags=re.IGNORECASE
-                )
-        
-        return varied_content
+        # Each word gets one synonym per call, picked when it is first seen
+        chosen = {}
+        
+        def replace(match):
+            word = match.group(1)
+            base_word = word.lower()
+            replacement = chosen.get(base_word)
+            if replacement is None:
+                replacement = chosen[base_word] = random.choice(self.synonyms[base_word])
+            
+            # Keep the original capitalization
+            if word.isupper():
+                return replacement.upper()
+            if word[0].isupper():
+                return replacement.capitalize()
+            return replacement
+        
+        return self._synonym_re.sub(replace, content)
 
     def add_unique_sections(self, content: str, keyword: str, variation_idx: int) -> str:
         """Add unique sections to make content substantially different"""
@@ -213,15 +224,21 @@ A recent implementation of {keyword} at TechCorp resulted in:
 This demonstrates the real-world impact of properly implementing {keyword}.
 """)
         
-        # Insert unique sections at appropriate points
-        for section in unique_sections:
-            # Find a good insertion point (after a paragraph break)
-            paragraphs = content.split('\n\n')
-            insert_pos = random.randint(len(paragraphs)//2, len(paragraphs)-1)
+        if not unique_sections:
+            return content
+        
+        # Insert unique sections at appropriate points (after a paragraph break),
+        # picked against the original paragraphs so the content is split and joined once
+        paragraphs = content.split('\n\n')
+        insertions = [
+            (random.randint(len(paragraphs)//2, len(paragraphs)-1), section)
+            for section in unique_sections
+        ]
+        # Back to front, so earlier positions still point at the original paragraphs
+        for insert_pos, section in sorted(insertions, key=lambda insertion: insertion[0], reverse=True):
             paragraphs.insert(insert_pos, section)
-            content = '\n\n'.join(paragraphs)
         
-        return content
+        return '\n\n'.join(paragraphs)
 
     def add_contextual_content(self, content: str, keyword: str) -> str:
         """Add location, time, or industry-specific context"""
@@ -240,75 +257,134 @@ This demonstrates the real-world impact of properly implementing {keyword}.
             )
         
         # Add industry context
-        industries = ["healthcare", "finance", "retail", "technology", "manufacturing"]
-        selected_industry = random.choice(industries)
+        selected_industry = random.choice(_INDUSTRIES)
         contextual_additions.append(
             f"In the {selected_industry} sector, {keyword} plays a particularly important role in driving innovation."
         )
         
-        # Insert contextual content
+        # Insert contextual content; additions extend existing paragraphs, so the
+        # paragraph list is split once and joined once
+        paragraphs = content.split('\n\n')
+        if len(paragraphs) <= 2:
+            return content
+        
         for addition in contextual_additions:
-            paragraphs = content.split('\n\n')
-            if len(paragraphs) > 2:
-                insert_pos = random.randint(1, len(paragraphs)-1)
-                paragraphs[insert_pos] = paragraphs[insert_pos] + " " + addition
-                content = '\n\n'.join(paragraphs)
+            insert_pos = random.randint(1, len(paragraphs)-1)
+            paragraphs[insert_pos] = paragraphs[insert_pos] + " " + addition
         
-        return content
+        return '\n\n'.join(paragraphs)
 
     def get_variation_type(self, index: int) -> str:
         """Determine variation type based on index"""
-        types = ["comprehensive", "detailed", "expert", "beginner-friendly", "technical", "practical"]
-        return types[index % len(types)]
+        return _VARIATION_TYPES[index % len(_VARIATION_TYPES)]
 
     def calculate_uniqueness_score(self, content1: str, content2: str) -> float:
         """Calculate uniqueness score between two pieces of content"""
         # Simple word-based comparison
-        words1 = set(content1.lower().split())
-        words2 = set(content2.lower().split())
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        # Jaccard similarity
-        similarity = len(intersection) / len(union) if union else 0
-        uniqueness = 1 - similarity
-        
-        return uniqueness * 100  # Return as percentage
+        return _uniqueness(_word_set(content1), _word_set(content2))
+
+    def calculate_uniqueness_matrix(self, contents: List[str]) -> List[List[float]]:
+        """Pairwise uniqueness scores for a batch of content, tokenizing each piece once"""
+        word_sets = [_word_set(content) for content in contents]
+        matrix = [[0.0] * len(contents) for _ in contents]
+        
+        for i, words1 in enumerate(word_sets):
+            # Scored like any other pair, so empty content stays 100 rather than 0
+            matrix[i][i] = _uniqueness(words1, words1)
+            for j in range(i + 1, len(word_sets)):
+                matrix[i][j] = matrix[j][i] = _uniqueness(words1, word_sets[j])
+        
+        return matrix
+
+
+def _word_set(content: str) -> set:
+    """Lowercased words of a piece of content"""
+    return set(content.lower().split())
+
+
+def _uniqueness(words1: set, words2: set) -> float:
+    """Uniqueness percentage of two word sets, 100 minus their Jaccard similarity"""
+    # |A ∪ B| follows from the intersection, so the union set is never built
+    common = len(words1 & words2)
+    union = len(words1) + len(words2) - common
+    
+    # Jaccard similarity
+    similarity = common / union if union else 0
+    uniqueness = 1 - similarity
+    
+    return uniqueness * 100  # Return as percentage
 
 # Quality enhancement functions
+@lru_cache(maxsize=100_000)
+def _keyword_tokens(keyword: str) -> frozenset:
+    """Lowercased words of a keyword, tokenized once per distinct keyword"""
+    return frozenset(keyword.lower().split())
+
+
+@lru_cache(maxsize=32)
+def _keyword_index(keywords: Tuple[str, ...]) -> Tuple[List[frozenset], Dict[str, List[int]]]:
+    """Word sets of a keyword catalog and an inverted index of word -> keyword positions"""
+    keyword_words = [_keyword_tokens(keyword) for keyword in keywords]
+    index: Dict[str, List[int]] = {}
+    for i, words in enumerate(keyword_words):
+        for word in words:
+            index.setdefault(word, []).append(i)
+    return keyword_words, index
+
+
 def generate_internal_links(current_keyword: str, all_keywords: List[str], cluster_info: Dict = None) -> List[Dict[str, str]]:
     """Generate intelligent internal links based on keyword relationships"""
     internal_links = []
     
-    # Clean current keyword for comparison
-    current_words = set(current_keyword.lower().split())
+    # Clean current keyword for comparison; its flags are the same for every candidate
+    current_lower = current_keyword.lower()
+    current_words = _keyword_tokens(current_keyword)
+    is_comparison = "vs" in current_lower
+    is_how_to = "how to" in current_lower
+    is_list = "best" in current_lower
+    same_cluster = bool(cluster_info and cluster_info.get('same_cluster'))
+    
+    # The catalog is shared by every page of a run, so it is indexed once
+    keywords = tuple(all_keywords)
+    catalog_words, index = _keyword_index(keywords)
+    
+    if same_cluster:
+        # Same-cluster pages link regardless of relevance
+        candidates = range(len(keywords))
+    else:
+        # Keywords sharing no word have zero relevance and can't be linked
+        candidates = sorted(set().union(*(index.get(word, ()) for word in current_words)))
     
     # Find related keywords
-    for keyword in all_keywords:
-        if keyword.lower() == current_keyword.lower():
+    for i in candidates:
+        keyword = keywords[i]
+        keyword_lower = keyword.lower()
+        if keyword_lower == current_lower:
             continue
             
-        keyword_words = set(keyword.lower().split())
+        keyword_words = catalog_words[i]
         
         # Calculate relevance score
         common_words = current_words.intersection(keyword_words)
         relevance_score = len(common_words) / max(len(current_words), len(keyword_words))
         
+        if relevance_score <= 0.2 and not same_cluster:
+            continue
+        
         # Determine link context
         link_context = "related"
         anchor_text = keyword
         
         # Smart anchor text generation
-        if "vs" in current_keyword.lower() and "vs" not in keyword.lower():
+        if is_comparison and "vs" not in keyword_lower:
             # Comparison article linking to individual topics
             anchor_text = f"learn more about {keyword}"
             link_context = "comparison_to_single"
-        elif "how to" in current_keyword.lower() and "how to" in keyword.lower():
+        elif is_how_to and "how to" in keyword_lower:
             # How-to articles linking to other how-tos
             anchor_text = f"similar guide: {keyword}"
             link_context = "similar_guide"
-        elif "best" in current_keyword.lower() and keyword.lower() in current_keyword.lower():
+        elif is_list and keyword_lower in current_lower:
             # List article linking to specific item
             anchor_text = f"detailed review of {keyword}"
             link_context = "list_to_item"
@@ -317,14 +393,13 @@ def generate_internal_links(current_keyword: str, all_keywords: List[str], clust
             anchor_text = keyword
             link_context = "related_topic"
         
-        if relevance_score > 0.2 or (cluster_info and cluster_info.get('same_cluster')):
-            internal_links.append({
-                'keyword': keyword,
-                'anchor_text': anchor_text,
-                'url': f"/guides/{keyword.lower().replace(' ', '-')}",
-                'relevance': relevance_score,
-                'context': link_context
-            })
+        internal_links.append({
+            'keyword': keyword,
+            'anchor_text': anchor_text,
+            'url': f"/guides/{keyword_lower.replace(' ', '-')}",
+            'relevance': relevance_score,
+            'context': link_context
+        })
     
     # Sort by relevance and limit
     internal_links.sort(key=lambda x: x['relevance'], reverse=True)
@@ -332,44 +407,58 @@ def generate_internal_links(current_keyword: str, all_keywords: List[str], clust
 
 def insert_contextual_links(content: str, internal_links: List[Dict[str, str]], keyword: str) -> str:
     """Insert internal links naturally within the content"""
-    linked_content = content
-    links_inserted = 0
     max_links = 5  # Maximum contextual links in body content
     
-    # Track which keywords we've already linked to avoid duplicate links
-    linked_keywords = set()
-    
+    # Candidate links in priority order with the words worth anchoring on,
+    # one per keyword to avoid duplicate links
+    candidates = []
+    seen_keywords = set()
     for link in internal_links:
-        if links_inserted >= max_links:
-            break
-            
         target_keyword = link['keyword']
-        if target_keyword in linked_keywords:
+        if target_keyword in seen_keywords:
             continue
-            
-        # Find natural places to insert the link
-        # Look for mentions of related concepts
-        search_terms = target_keyword.lower().split()
+        seen_keywords.add(target_keyword)
+        
+        search_terms = [term for term in target_keyword.lower().split() if len(term) > 3]
+        if search_terms:
+            candidates.append((link, search_terms))
+    
+    if not candidates:
+        return content
+    
+    # Each link anchors on the first mention of its first term that has one,
+    # searched in the original content and skipping text already linked. The
+    # lowercased copy is made once; a plain substring test is much cheaper than
+    # a case-insensitive regex scan for terms the content doesn't mention
+    content_lower = content.lower()
+    linked_spans = []
+    for link, search_terms in candidates:
+        if len(linked_spans) >= max_links:
+            break
         
         for term in search_terms:
-            if len(term) > 3 and term in linked_content.lower() and target_keyword not in linked_keywords:
-                # Find the exact position (case-insensitive)
-                import re
-                pattern = r'\b' + re.escape(term) + r'\b'
-                match = re.search(pattern, linked_content, re.IGNORECASE)
-                
-                if match:
-                    # Create the link
-                    link_html = f'<a href="{link["url"]}" title="{target_keyword}">{match.group()}</a>'
-                    
-                    # Replace only the first occurrence
-                    linked_content = linked_content[:match.start()] + link_html + linked_content[match.end():]
-                    
-                    linked_keywords.add(target_keyword)
-                    links_inserted += 1
-                    break
+            if term not in content_lower:
+                continue
+            pattern = re.compile(r'\b' + re.escape(term) + r'\b', re.IGNORECASE)
+            span = next((
+                match.span() for match in pattern.finditer(content)
+                if all(match.end() <= linked_start or match.start() >= linked_end
+                       for linked_start, linked_end, _ in linked_spans)
+            ), None)
+            if span:
+                linked_spans.append((*span, link))
+                break
     
-    return linked_content
+    # Build the linked content from slices of the original in one pass
+    parts = []
+    prev = 0
+    for start, end, link in sorted(linked_spans, key=lambda linked: linked[0]):
+        parts.append(content[prev:start])
+        parts.append(f'<a href="{link["url"]}" title="{link["keyword"]}">{content[start:end]}</a>')
+        prev = end
+    parts.append(content[prev:])
+    
+    return ''.join(parts)
 
 def enhance_content_quality(content: str, keyword: str, business_info: Dict, 
                           all_keywords: List[str] = None, cluster_keywords: List[str] = None) -> str:
@@ -430,13 +519,6 @@ Explore these related guides to deepen your understanding:
         
         enhancements.append(related_links_html)
     
-    # Add navigation breadcrumbs
-    breadcrumb_html = f"""
-<nav class="breadcrumbs">
-<a href="/">Home</a> > <a href="/{business_info.get('industry', 'guides').lower()}">{business_info.get('industry', 'Guides')}</a> > {keyword}
-</nav>
-"""
-    
     # Add hub page link if part of a cluster
     if cluster_keywords and len(cluster_keywords) > 5:
         hub_topic = keyword.split()[0] if len(keyword.split()) > 1 else keyword
@@ -487,26 +569,31 @@ Our team at {business_info.get('name', 'Our Company')} has helped over 500 busin
 implement effective {keyword} strategies.
 """)
     
-    # Combine enhancements with original content
-    enhanced_content = content
-    for enhancement in enhancements:
-        enhanced_content += "\n\n" + enhancement
-    
-    return enhanced_content
+    # Combine enhancements with original content in a single join
+    return "\n\n".join([content, *enhancements])
 
 def ensure_minimum_quality(content: str, keyword: str) -> Dict[str, Any]:
     """Ensure content meets minimum quality standards"""
     word_count = len(content.split())
     
+    # Only "more than five" short sentences matters, so stop counting there
+    short_sentences = 0
+    for sentence in content.split('.'):
+        if len(sentence.split()) < 20:
+            short_sentences += 1
+            if short_sentences > 5:
+                break
+    
     quality_checks = {
         "word_count": word_count,
         "meets_minimum": word_count >= 800,
-        "has_headers": "##" in content or "#" in content,
+        "has_headers": "#" in content,
         "has_lists": "-" in content or "1." in content,
-        "has_paragraphs": len(content.split('\n\n')) > 3,
+        # Counted rather than split: n breaks make n + 1 paragraphs
+        "has_paragraphs": content.count('\n\n') > 2,
         "keyword_density": content.lower().count(keyword.lower()) / word_count * 100,
         "readability_elements": {
-            "short_sentences": len([s for s in content.split('.') if len(s.split()) < 20]) > 5,
+            "short_sentences": short_sentences > 5,
             "bullet_points": content.count('\n-') > 2,
             "subheadings": content.count('\n##') > 2
         }
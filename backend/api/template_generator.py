@@ -1,245 +1,318 @@
 """Template and page generator for true programmatic SEO - creates pages at scale using templates + data"""
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
+import copy
 import itertools
-import pandas as pd
+import math
+import re
 import json
 import csv
 from io import StringIO
 
+try:
+    from .ai_handler import AIHandler
+except ImportError:
+    AIHandler = None
+
+_PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+# AI-regenerated category templates, shared across generator instances (one per request)
+_AI_TEMPLATE_CACHE: Dict[tuple, Dict] = {}
+_AI_TEMPLATE_CACHE_SIZE = 128
+# Unknown seed categories regenerated with AI at the same time
+_AI_REGENERATION_WORKERS = 4
+
+
+@lru_cache(maxsize=1024)
+def _compile_pattern(pattern: str, names: Optional[Tuple[str, ...]] = None) -> Tuple[Tuple[str, ...], str]:
+    """Compile a {variable} pattern once into its placeholder names and a positional format string.
+
+    Each placeholder reads the first position of its name in ``names`` (the pattern's own
+    placeholders by default); placeholders missing from ``names`` are kept as literal text.
+    """
+    parts = _PLACEHOLDER_RE.split(pattern)
+    placeholders = tuple(parts[1::2])
+    positions = {}
+    for i, name in enumerate(placeholders if names is None else names):
+        positions.setdefault(name, i)
+    
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            parts[i] = part.replace('{', '{{').replace('}', '}}')
+        elif part in positions:
+            parts[i] = f"{{{positions[part]}}}"
+        else:
+            parts[i] = f"{{{{{part}}}}}"
+    return placeholders, ''.join(parts)
+
+
+# Template library for programmatic SEO - adaptable to any business.
+# Shared by every generator and read-only: seeds fill their variables into a fresh dict.
+_TEMPLATE_LIBRARY = {
+    "location_based": {
+        "templates": [
+            "{service} {location}",
+            "best {service} in {location}",
+            "{service} near me",
+            "{location} {service} cost",
+            "{service} {location} prices",
+            "{service} {location} reviews",
+            "cheap {service} {location}",
+            "{service} companies {location}",
+            "{location} {service} near me",
+            "find {service} in {location}"
+        ],
+        "variables": {
+            "location": [],  # Will be populated dynamically
+            "service": [],  # Will be populated based on business
+            "metric": [
+                "cost", "prices", "reviews", "ratings", "comparison",
+                "guide", "tips", "benefits", "pros and cons"
+            ],
+            "year": ["2024", "2025"],
+            "price_range": [
+                "budget", "cheap", "affordable", "premium", "luxury"
+            ],
+            "business_attribute": [
+                "hours", "location", "services", "specialties", "expertise"
+            ]
+        }
+    },
+    "problem_solution": {
+        "templates": [
+            "how to fix {problem}",
+            "{problem} solutions",
+            "solve {problem}",
+            "fix {problem} fast",
+            "best way to fix {problem}",
+            "{problem} troubleshooting",
+            "{problem} not working",
+            "why is my {problem}"
+        ],
+        "variables": {
+            "problem": [],  # Will be populated based on business
+            "solution": [],  # Will be populated based on business
+            "audience": ["beginners", "professionals", "small business", "enterprises"],
+            "method": [],  # Will be populated based on business
+            "solution_type": ["software", "service", "tool", "guide", "checklist"],
+            "solve": ["fix", "resolve", "handle", "manage", "overcome"],
+            "avoid": ["expensive tools", "technical knowledge", "hiring experts"],
+            "year": ["2024", "2025"]
+        }
+    },
+    "comparison_based": {
+        "templates": [
+            "{item1} vs {item2}",
+            "{item1} or {item2} which is better",
+            "compare {item1} and {item2} {metric}",
+            "{item1} vs {item2} for {use_case}",
+            "difference between {item1} and {item2}",
+            "{item1} alternatives to {item2}"
+        ],
+        "variables": {
+            "item1": [],  # Will be populated based on business
+            "item2": [],  # Will be populated based on business
+            "metric": ["features", "pricing", "performance", "quality", "value"],
+            "use_case": []  # Will be populated based on business
+        }
+    },
+    "how_to_based": {
+        "templates": [
+            "how to {action} {topic}",
+            "how to {action} {topic} {modifier}",
+            "guide to {action} {topic}",
+            "step by step {action} {topic}",
+            "tutorial {action} {topic}",
+            "{action} {topic} for beginners",
+            "best way to {action} {topic}"
+        ],
+        "variables": {
+            "action": [],  # Will be populated based on business
+            "topic": [],  # Will be populated based on business
+            "modifier": [
+                "quickly", "easily", "professionally", "cheaply", 
+                "without experience", "like a pro", "in 2024"
+            ]
+        }
+    },
+    "tool_based": {
+        "templates": [
+            "{tool_type} for {use_case}",
+            "free {tool_type} {modifier}",
+            "best {tool_type} {year}",
+            "{tool_type} {platform}",
+            "{tool_type} vs {tool_type2}",
+            "how to use {tool_type}"
+        ],
+        "variables": {
+            "tool_type": [],  # Will be populated based on business
+            "use_case": [],  # Will be populated based on business
+            "modifier": ["online", "download", "app", "software", "tool"],
+            "platform": ["windows", "mac", "ios", "android", "web"],
+            "year": ["2024", "2025"]
+        }
+    },
+    "question_based": {
+        "templates": [
+            "what is {topic}",
+            "why {question} {topic}",
+            "when to {action} {topic}",
+            "where to {action} {topic}",
+            "is {topic} {attribute}",
+            "can {topic} {capability}",
+            "should I {action} {topic}"
+        ],
+        "variables": {
+            "topic": [],  # Will be populated based on business
+            "question": ["use", "choose", "buy", "try", "consider"],
+            "action": [],  # Will be populated based on business
+            "attribute": ["worth it", "legit", "safe", "reliable", "good"],
+            "capability": []  # Will be populated based on business
+        }
+    },
+    "integration_based": {
+        "templates": [
+            "{product} integration with {platform}",
+            "how to connect {product} to {platform}",
+            "{product} {platform} API",
+            "{product} and {platform} workflow",
+            "sync {product} with {platform}"
+        ],
+        "variables": {
+            "product": [],  # Will be populated based on business
+            "platform": ["Salesforce", "HubSpot", "Slack", "Google Workspace", "Microsoft 365", "Zapier", "Stripe", "QuickBooks"]
+        }
+    },
+    "pricing_based": {
+        "templates": [
+            "{product} pricing {year}",
+            "{product} {plan_type} plan",
+            "is {product} {price_attribute}",
+            "{product} cost for {user_type}",
+            "{product} pricing vs {competitor}"
+        ],
+        "variables": {
+            "product": [],  # Will be populated based on business
+            "plan_type": ["free", "starter", "pro", "enterprise", "basic", "premium"],
+            "price_attribute": ["free", "worth it", "expensive", "affordable"],
+            "user_type": ["small business", "startups", "enterprises", "freelancers"],
+            "competitor": [],  # Will be populated based on business
+            "year": ["2024", "2025"]
+        }
+    },
+    "product_based": {
+        "templates": [
+            "best {product_type} for {use_case}",
+            "{product_type} {attribute} {year}",
+            "top {number} {product_type} {category}",
+            "{product_type} under {price}",
+            "{product_type} with {feature}"
+        ],
+        "variables": {
+            "product_type": [],  # Will be populated based on business
+            "use_case": ["beginners", "professionals", "students", "home use", "business"],
+            "attribute": ["reviews", "comparison", "guide", "recommendations"],
+            "number": ["10", "5", "20", "15"],
+            "category": ["2024", "budget", "premium", "new"],
+            "price": ["$50", "$100", "$200", "$500"],
+            "feature": [],  # Will be populated based on business
+            "year": ["2024", "2025"]
+        }
+    },
+    "deals_based": {
+        "templates": [
+            "{product} {deal_type} {time_period}",
+            "{product} promo code {year}",
+            "{product} {percent} off",
+            "save on {product} {method}",
+            "{product} {holiday} sale"
+        ],
+        "variables": {
+            "product": [],  # Will be populated based on business
+            "deal_type": ["coupon", "discount", "deals", "sale", "clearance"],
+            "time_period": ["today", "this week", "this month", "2024", "2025"],
+            "percent": ["10%", "20%", "30%", "50%", "25%"],
+            "method": ["student discount", "bulk pricing", "annual plan", "referral"],
+            "holiday": ["black friday", "cyber monday", "christmas", "new year"],
+            "year": ["2024", "2025"]
+        }
+    },
+    "service_based": {
+        "templates": [
+            "{service} for {business_type}",
+            "{location} {service} {specialization}",
+            "hire {service} {modifier}",
+            "{service} {price_range} {location}",
+            "find {service} near {location}"
+        ],
+        "variables": {
+            "service": [],  # Will be populated based on business
+            "business_type": ["small business", "startups", "enterprises", "nonprofits", "agencies"],
+            "location": [],  # Will be populated if location-based
+            "specialization": [],  # Will be populated based on business
+            "modifier": ["online", "remote", "local", "certified", "experienced"],
+            "price_range": ["affordable", "cheap", "premium", "budget-friendly"]
+        }
+    }
+}
+
+# Industry-specific examples (for reference)
+_INDUSTRY_EXAMPLES = {
+    "real_estate": {
+        "service": ["homes", "condos", "apartments", "real estate", "properties"],
+        "action": ["buy", "sell", "rent", "invest in", "find"],
+        "tool_type": ["calculator", "analyzer", "estimator", "tracker"]
+    },
+    "ecommerce": {
+        "service": ["products", "deals", "shipping", "returns"],
+        "action": ["shop", "buy", "order", "return", "track"],
+        "tool_type": ["price tracker", "comparison tool", "coupon finder"]
+    },
+    "saas": {
+        "service": ["software", "platform", "solution", "tool"],
+        "action": ["integrate", "setup", "use", "optimize", "migrate"],
+        "tool_type": ["integration", "api", "plugin", "extension"]
+    },
+    "local_business": {
+        "service": ["service", "repair", "installation", "consultation"],
+        "action": ["book", "schedule", "find", "hire", "contact"],
+        "tool_type": ["booking system", "scheduler", "locator", "directory"]
+    }
+}
+
+# Generic fallback values for template variables the business info does not cover.
+# Tuples, since _get_generic_variables hands these shared values to every caller
+_GENERIC_VARIABLES = {
+    'service': ('service', 'product', 'solution', 'software', 'platform'),
+    'action': ('use', 'get', 'find', 'choose', 'implement', 'setup'),
+    'topic': ('features', 'benefits', 'options', 'capabilities', 'functions'),
+    'tool_type': ('tool', 'calculator', 'analyzer', 'tracker', 'dashboard'),
+    'use_case': ('business', 'startups', 'enterprises', 'teams', 'projects'),
+    'item1': ('option1', 'choice1', 'solution1', 'tool1', 'platform1'),
+    'item2': ('option2', 'choice2', 'solution2', 'tool2', 'platform2'),
+    'problem': ('challenges', 'issues', 'difficulties', 'problems', 'obstacles'),
+    'solution': ('solutions', 'fixes', 'remedies', 'approaches', 'methods'),
+    'audience': ('businesses', 'teams', 'professionals', 'users', 'companies'),
+    'method': ('approach', 'strategy', 'technique', 'process', 'system'),
+    'solve': ('fix', 'resolve', 'address', 'handle', 'overcome'),
+    'avoid': ('mistakes', 'errors', 'pitfalls', 'problems', 'issues'),
+    'year': ('2024', '2025'),
+    'price_range': ('affordable', 'budget', 'premium', 'enterprise', 'free'),
+    'modifier': ('best', 'top', 'leading', 'popular', 'recommended'),
+    'metric': ('cost', 'price', 'roi', 'performance', 'efficiency'),
+    'property_type': ('homes', 'condos', 'apartments', 'properties', 'real estate'),
+    'time': ('2024', '2025', 'this year', 'forecast', 'trends')
+}
+
+
 class TemplateGenerator:
     def __init__(self):
-        # Template library for programmatic SEO - adaptable to any business
-        self.template_library = {
-            "location_based": {
-                "templates": [
-                    "{service} {location}",
-                    "best {service} in {location}",
-                    "{service} near me",
-                    "{location} {service} cost",
-                    "{service} {location} prices",
-                    "{service} {location} reviews",
-                    "cheap {service} {location}",
-                    "{service} companies {location}",
-                    "{location} {service} near me",
-                    "find {service} in {location}"
-                ],
-                "variables": {
-                    "location": [],  # Will be populated dynamically
-                    "service": [],  # Will be populated based on business
-                    "metric": [
-                        "cost", "prices", "reviews", "ratings", "comparison",
-                        "guide", "tips", "benefits", "pros and cons"
-                    ],
-                    "year": ["2024", "2025"],
-                    "price_range": [
-                        "budget", "cheap", "affordable", "premium", "luxury"
-                    ],
-                    "business_attribute": [
-                        "hours", "location", "services", "specialties", "expertise"
-                    ]
-                }
-            },
-            "problem_solution": {
-                "templates": [
-                    "how to fix {problem}",
-                    "{problem} solutions",
-                    "solve {problem}",
-                    "fix {problem} fast",
-                    "best way to fix {problem}",
-                    "{problem} troubleshooting",
-                    "{problem} not working",
-                    "why is my {problem}"
-                ],
-                "variables": {
-                    "problem": [],  # Will be populated based on business
-                    "solution": [],  # Will be populated based on business
-                    "audience": ["beginners", "professionals", "small business", "enterprises"],
-                    "method": [],  # Will be populated based on business
-                    "solution_type": ["software", "service", "tool", "guide", "checklist"],
-                    "solve": ["fix", "resolve", "handle", "manage", "overcome"],
-                    "avoid": ["expensive tools", "technical knowledge", "hiring experts"],
-                    "year": ["2024", "2025"]
-                }
-            },
-            "comparison_based": {
-                "templates": [
-                    "{item1} vs {item2}",
-                    "{item1} or {item2} which is better",
-                    "compare {item1} and {item2} {metric}",
-                    "{item1} vs {item2} for {use_case}",
-                    "difference between {item1} and {item2}",
-                    "{item1} alternatives to {item2}"
-                ],
-                "variables": {
-                    "item1": [],  # Will be populated based on business
-                    "item2": [],  # Will be populated based on business
-                    "metric": ["features", "pricing", "performance", "quality", "value"],
-                    "use_case": []  # Will be populated based on business
-                }
-            },
-            "how_to_based": {
-                "templates": [
-                    "how to {action} {topic}",
-                    "how to {action} {topic} {modifier}",
-                    "guide to {action} {topic}",
-                    "step by step {action} {topic}",
-                    "tutorial {action} {topic}",
-                    "{action} {topic} for beginners",
-                    "best way to {action} {topic}"
-                ],
-                "variables": {
-                    "action": [],  # Will be populated based on business
-                    "topic": [],  # Will be populated based on business
-                    "modifier": [
-                        "quickly", "easily", "professionally", "cheaply", 
-                        "without experience", "like a pro", "in 2024"
-                    ]
-                }
-            },
-            "tool_based": {
-                "templates": [
-                    "{tool_type} for {use_case}",
-                    "free {tool_type} {modifier}",
-                    "best {tool_type} {year}",
-                    "{tool_type} {platform}",
-                    "{tool_type} vs {tool_type2}",
-                    "how to use {tool_type}"
-                ],
-                "variables": {
-                    "tool_type": [],  # Will be populated based on business
-                    "use_case": [],  # Will be populated based on business
-                    "modifier": ["online", "download", "app", "software", "tool"],
-                    "platform": ["windows", "mac", "ios", "android", "web"],
-                    "year": ["2024", "2025"]
-                }
-            },
-            "question_based": {
-                "templates": [
-                    "what is {topic}",
-                    "why {question} {topic}",
-                    "when to {action} {topic}",
-                    "where to {action} {topic}",
-                    "is {topic} {attribute}",
-                    "can {topic} {capability}",
-                    "should I {action} {topic}"
-                ],
-                "variables": {
-                    "topic": [],  # Will be populated based on business
-                    "question": ["use", "choose", "buy", "try", "consider"],
-                    "action": [],  # Will be populated based on business
-                    "attribute": ["worth it", "legit", "safe", "reliable", "good"],
-                    "capability": []  # Will be populated based on business
-                }
-            },
-            "integration_based": {
-                "templates": [
-                    "{product} integration with {platform}",
-                    "how to connect {product} to {platform}",
-                    "{product} {platform} API",
-                    "{product} and {platform} workflow",
-                    "sync {product} with {platform}"
-                ],
-                "variables": {
-                    "product": [],  # Will be populated based on business
-                    "platform": ["Salesforce", "HubSpot", "Slack", "Google Workspace", "Microsoft 365", "Zapier", "Stripe", "QuickBooks"]
-                }
-            },
-            "pricing_based": {
-                "templates": [
-                    "{product} pricing {year}",
-                    "{product} {plan_type} plan",
-                    "is {product} {price_attribute}",
-                    "{product} cost for {user_type}",
-                    "{product} pricing vs {competitor}"
-                ],
-                "variables": {
-                    "product": [],  # Will be populated based on business
-                    "plan_type": ["free", "starter", "pro", "enterprise", "basic", "premium"],
-                    "price_attribute": ["free", "worth it", "expensive", "affordable"],
-                    "user_type": ["small business", "startups", "enterprises", "freelancers"],
-                    "competitor": [],  # Will be populated based on business
-                    "year": ["2024", "2025"]
-                }
-            },
-            "product_based": {
-                "templates": [
-                    "best {product_type} for {use_case}",
-                    "{product_type} {attribute} {year}",
-                    "top {number} {product_type} {category}",
-                    "{product_type} under {price}",
-                    "{product_type} with {feature}"
-                ],
-                "variables": {
-                    "product_type": [],  # Will be populated based on business
-                    "use_case": ["beginners", "professionals", "students", "home use", "business"],
-                    "attribute": ["reviews", "comparison", "guide", "recommendations"],
-                    "number": ["10", "5", "20", "15"],
-                    "category": ["2024", "budget", "premium", "new"],
-                    "price": ["$50", "$100", "$200", "$500"],
-                    "feature": [],  # Will be populated based on business
-                    "year": ["2024", "2025"]
-                }
-            },
-            "deals_based": {
-                "templates": [
-                    "{product} {deal_type} {time_period}",
-                    "{product} promo code {year}",
-                    "{product} {percent} off",
-                    "save on {product} {method}",
-                    "{product} {holiday} sale"
-                ],
-                "variables": {
-                    "product": [],  # Will be populated based on business
-                    "deal_type": ["coupon", "discount", "deals", "sale", "clearance"],
-                    "time_period": ["today", "this week", "this month", "2024", "2025"],
-                    "percent": ["10%", "20%", "30%", "50%", "25%"],
-                    "method": ["student discount", "bulk pricing", "annual plan", "referral"],
-                    "holiday": ["black friday", "cyber monday", "christmas", "new year"],
-                    "year": ["2024", "2025"]
-                }
-            },
-            "service_based": {
-                "templates": [
-                    "{service} for {business_type}",
-                    "{location} {service} {specialization}",
-                    "hire {service} {modifier}",
-                    "{service} {price_range} {location}",
-                    "find {service} near {location}"
-                ],
-                "variables": {
-                    "service": [],  # Will be populated based on business
-                    "business_type": ["small business", "startups", "enterprises", "nonprofits", "agencies"],
-                    "location": [],  # Will be populated if location-based
-                    "specialization": [],  # Will be populated based on business
-                    "modifier": ["online", "remote", "local", "certified", "experienced"],
-                    "price_range": ["affordable", "cheap", "premium", "budget-friendly"]
-                }
-            }
-        }
+        # Built-in templates plus any this generator adds (custom or AI-generated)
+        self.template_library = dict(_TEMPLATE_LIBRARY)
         
         # Industry-specific examples (for reference)
-        self.industry_examples = {
-            "real_estate": {
-                "service": ["homes", "condos", "apartments", "real estate", "properties"],
-                "action": ["buy", "sell", "rent", "invest in", "find"],
-                "tool_type": ["calculator", "analyzer", "estimator", "tracker"]
-            },
-            "ecommerce": {
-                "service": ["products", "deals", "shipping", "returns"],
-                "action": ["shop", "buy", "order", "return", "track"],
-                "tool_type": ["price tracker", "comparison tool", "coupon finder"]
-            },
-            "saas": {
-                "service": ["software", "platform", "solution", "tool"],
-                "action": ["integrate", "setup", "use", "optimize", "migrate"],
-                "tool_type": ["integration", "api", "plugin", "extension"]
-            },
-            "local_business": {
-                "service": ["service", "repair", "installation", "consultation"],
-                "action": ["book", "schedule", "find", "hire", "contact"],
-                "tool_type": ["booking system", "scheduler", "locator", "directory"]
-            }
-        }
+        self.industry_examples = _INDUSTRY_EXAMPLES
         
         # Store imported data sources
         self.data_sources = {}
@@ -249,15 +322,17 @@ class TemplateGenerator:
     def import_data_from_csv(self, csv_content: str, data_name: str) -> Dict[str, List[str]]:
         """Import data from CSV for template variables"""
         try:
-            # Parse CSV
-            df = pd.read_csv(StringIO(csv_content))
+            # Parse CSV (header row first)
+            reader = csv.DictReader(StringIO(csv_content))
+            columns = {column: {} for column in reader.fieldnames or []}
             
-            # Extract columns as data sources
-            data = {}
-            for column in df.columns:
-                # Clean and store unique values
-                values = df[column].dropna().unique().tolist()
-                data[column.lower().replace(' ', '_')] = [str(v).strip() for v in values]
+            # Extract columns as data sources: unique, non-empty values in first-seen order
+            for row in reader:
+                for column, values in columns.items():
+                    value = row.get(column)
+                    if value and not value.isspace():
+                        values[value.strip()] = None
+            data = {column.lower().replace(' ', '_'): list(values) for column, values in columns.items()}
             
             # Store for later use
             self.data_sources[data_name] = data
@@ -270,8 +345,7 @@ class TemplateGenerator:
     def create_template(self, name: str, pattern: str, page_structure: Dict[str, str]) -> Dict:
         """Create a custom template for page generation"""
         # Extract variables from pattern
-        import re
-        variables = re.findall(r'\{(\w+)\}', pattern)
+        variables = list(_compile_pattern(pattern)[0])
         
         template = {
             "name": name,
@@ -306,17 +380,17 @@ class TemplateGenerator:
                 print(f"Warning: No data provided for variable '{var}'")
                 variable_data.append([''])
         
+        # Compile the pattern once; titles are then filled in a single format call
+        _, title_format = _compile_pattern(pattern, tuple(dict.fromkeys(variables)))
+        
         # Generate all combinations
         pages = []
         for combo in itertools.product(*variable_data):
             # Create page from template
-            page_data = {}
             variable_map = dict(zip(variables, combo))
             
             # Generate title
-            title = pattern
-            for var, val in variable_map.items():
-                title = title.replace(f'{{{var}}}', val)
+            title = title_format.format(*variable_map.values())
             
             # Generate URL
             url = title.lower().replace(' ', '-')
@@ -426,22 +500,23 @@ class TemplateGenerator:
         # Populate business-specific variables
         business_variables = self._extract_business_variables(business_info)
         
+        # Start regenerating unknown categories now, so their AI calls overlap
+        regenerating = self._start_template_regeneration(seeds, business_info, market_context)
+        
         for seed in seeds:
             category = seed["category"]
             template_group = seed["template_group"]
             
-            # Get the template configuration
-            config = self.template_library.get(category, {}).copy()
+            # Get the template configuration (read-only; variables are filled into a new dict below)
+            config = self.template_library.get(category)
             
             if not config:
                 print(f"Warning: No template found for category '{category}' - trying AI regeneration")
                 # Try to regenerate this specific template with AI
                 try:
-                    from .ai_handler import AIHandler
-                    ai = AIHandler()
-                    if ai.has_ai_provider():
-                        # Generate template specifically for this category with market context
-                        ai_template = self._generate_single_template_with_ai(category, business_info, ai, market_context)
+                    if regenerating is not None:
+                        # Template generated specifically for this category with market context
+                        ai_template = regenerating[category].result()
                         if ai_template:
                             config = ai_template
                             # Store for future use in this session
@@ -456,17 +531,21 @@ class TemplateGenerator:
                     print(f"Error regenerating template for '{category}': {e} - skipping")
                     continue
                 
-            # Populate variables with business-specific data
-            for var_name in config["variables"]:
+            # Populate variables with business-specific data, in a fresh dict so the
+            # (shared) library entry is never written to
+            variables = {}
+            for var_name, values in config["variables"].items():
                 if var_name == "location":
-                    config["variables"]["location"] = locations
+                    values = locations
                 elif var_name == "location2":
-                    config["variables"]["location2"] = locations[1:6] if len(locations) > 1 else locations
+                    values = locations[1:6] if len(locations) > 1 else locations
                 elif var_name in business_variables:
-                    config["variables"][var_name] = business_variables[var_name]
-                elif not config["variables"][var_name]:  # Empty list
+                    values = business_variables[var_name]
+                elif not values:  # Empty list
                     # Use generic fallbacks
-                    config["variables"][var_name] = self._get_generic_variables(var_name)
+                    values = self._get_generic_variables(var_name)
+                variables[var_name] = values
+            config = {**config, "variables": variables}
             
             # Calculate variations for this seed
             variation_count = self.calculate_variations(config)
@@ -503,6 +582,34 @@ class TemplateGenerator:
         
         return results
 
+    def _start_template_regeneration(self, seeds: List[Dict], business_info: Dict,
+                                     market_context: Dict = None) -> Optional[Dict[str, Future]]:
+        """Submit AI regeneration for every seed category missing from the library.
+
+        Each regeneration is two blocking AI calls, so they run on a thread pool instead of
+        one seed at a time. Returns futures keyed by category, or None when no AI is available.
+        """
+        missing = [category for category in dict.fromkeys(seed["category"] for seed in seeds)
+                   if category not in self.template_library]
+        if not missing:
+            return {}
+        
+        try:
+            ai = AIHandler() if AIHandler else None
+            if not (ai and ai.has_ai_provider()):
+                return None
+        except Exception as e:
+            print(f"Error setting up AI template regeneration: {e}")
+            return None
+        
+        executor = ThreadPoolExecutor(max_workers=min(len(missing), _AI_REGENERATION_WORKERS))
+        futures = {
+            category: executor.submit(self._generate_single_template_with_ai, category, business_info, ai, market_context)
+            for category in missing
+        }
+        executor.shutdown(wait=False)
+        return futures
+
     def _generate_keywords_from_config(self, config: Dict, limit: int = None) -> List[str]:
         """Generate actual keywords from a configuration"""
         keywords = []
@@ -510,8 +617,7 @@ class TemplateGenerator:
         
         for template in config["templates"]:
             # Extract variable names from template
-            import re
-            var_names = re.findall(r'\{(\w+)\}', template)
+            var_names, keyword_format = _compile_pattern(template)
             
             if not var_names:
                 keywords.append(template)
@@ -525,18 +631,17 @@ class TemplateGenerator:
                 else:
                     var_values.append([var])  # Use variable name as placeholder
             
-            # Generate combinations
-            for combination in itertools.product(*var_values):
-                if limit and count >= limit:
-                    return keywords
-                
-                # Create keyword by replacing variables
-                keyword = template
-                for var_name, var_value in zip(var_names, combination):
-                    keyword = keyword.replace(f"{{{var_name}}}", var_value)
-                
-                keywords.append(keyword)
-                count += 1
+            # Generate combinations, stopping at the limit without checking it per keyword
+            combinations = itertools.product(*var_values)
+            combination_count = math.prod(len(values) for values in var_values)
+            if limit and count + combination_count > limit:
+                keywords.extend(itertools.starmap(
+                    keyword_format.format, itertools.islice(combinations, max(limit - count, 0))
+                ))
+                return keywords
+            
+            keywords.extend(itertools.starmap(keyword_format.format, combinations))
+            count += combination_count
         
         return keywords
 
@@ -549,9 +654,8 @@ class TemplateGenerator:
         # Try AI-generated templates first
         if use_ai:
             try:
-                from .ai_handler import AIHandler
-                ai = AIHandler()
-                if ai.has_ai_provider():
+                ai = AIHandler() if AIHandler else None
+                if ai and ai.has_ai_provider():
                     print(f"Attempting comprehensive AI template generation for business: {business_info.get('name', 'Unknown')}")
                     ai_suggestions = self._get_ai_template_suggestions(business_info, ai, market_context)
                     if ai_suggestions:
@@ -980,30 +1084,9 @@ class TemplateGenerator:
         
         return variables
     
-    def _get_generic_variables(self, var_name: str) -> List[str]:
-        """Get generic fallback variables"""
-        generic_vars = {
-            'service': ['service', 'product', 'solution', 'software', 'platform'],
-            'action': ['use', 'get', 'find', 'choose', 'implement', 'setup'],
-            'topic': ['features', 'benefits', 'options', 'capabilities', 'functions'],
-            'tool_type': ['tool', 'calculator', 'analyzer', 'tracker', 'dashboard'],
-            'use_case': ['business', 'startups', 'enterprises', 'teams', 'projects'],
-            'item1': ['option1', 'choice1', 'solution1', 'tool1', 'platform1'],
-            'item2': ['option2', 'choice2', 'solution2', 'tool2', 'platform2'],
-            'problem': ['challenges', 'issues', 'difficulties', 'problems', 'obstacles'],
-            'solution': ['solutions', 'fixes', 'remedies', 'approaches', 'methods'],
-            'audience': ['businesses', 'teams', 'professionals', 'users', 'companies'],
-            'method': ['approach', 'strategy', 'technique', 'process', 'system'],
-            'solve': ['fix', 'resolve', 'address', 'handle', 'overcome'],
-            'avoid': ['mistakes', 'errors', 'pitfalls', 'problems', 'issues'],
-            'year': ['2024', '2025'],
-            'price_range': ['affordable', 'budget', 'premium', 'enterprise', 'free'],
-            'modifier': ['best', 'top', 'leading', 'popular', 'recommended'],
-            'metric': ['cost', 'price', 'roi', 'performance', 'efficiency'],
-            'property_type': ['homes', 'condos', 'apartments', 'properties', 'real estate'],
-            'time': ['2024', '2025', 'this year', 'forecast', 'trends']
-        }
-        return generic_vars.get(var_name, [var_name])
+    def _get_generic_variables(self, var_name: str) -> Tuple[str, ...]:
+        """Get generic fallback variables (read-only, shared across calls)"""
+        return _GENERIC_VARIABLES.get(var_name, (var_name,))
     
     def _get_ai_template_suggestions(self, business_info: Dict, ai_handler, market_context: Dict = None) -> List[Dict]:
         """Generate custom page templates using comprehensive business analysis"""
@@ -1059,9 +1142,6 @@ class TemplateGenerator:
             print(f"AI response received: {len(response_text)} characters")
             
             # Extract JSON from response
-            import json
-            import re
-            
             content = response_text
             
             # Find JSON array in response
@@ -1104,7 +1184,26 @@ class TemplateGenerator:
         return []
     
     def _generate_single_template_with_ai(self, category: str, business_info: Dict, ai_handler, market_context: Dict = None) -> Dict:
-        """Generate a specific template for a missing category using AI"""
+        """Generate a specific template for a missing category using AI, reusing earlier results for the same business"""
+        cache_key = (
+            category,
+            json.dumps(business_info, sort_keys=True, default=str),
+            json.dumps(market_context, sort_keys=True, default=str)
+        )
+        if cache_key in _AI_TEMPLATE_CACHE:
+            # The template ends up in the caller's mutable template_library, so hand out
+            # a copy that later edits there can't leak back into the shared cache
+            return copy.deepcopy(_AI_TEMPLATE_CACHE[cache_key])
+        
+        template_data = self._request_single_template_with_ai(category, business_info, ai_handler, market_context)
+        if template_data:
+            if len(_AI_TEMPLATE_CACHE) >= _AI_TEMPLATE_CACHE_SIZE:
+                _AI_TEMPLATE_CACHE.pop(next(iter(_AI_TEMPLATE_CACHE)), None)
+            _AI_TEMPLATE_CACHE[cache_key] = copy.deepcopy(template_data)
+        return template_data
+    
+    def _request_single_template_with_ai(self, category: str, business_info: Dict, ai_handler, market_context: Dict = None) -> Dict:
+        """Ask the AI for a template for a single category"""
         
         # Extract intelligent market context using AI
         market_intelligence = self._extract_market_intelligence(business_info, market_context, ai_handler)
@@ -1160,9 +1259,6 @@ class TemplateGenerator:
                 return None
             
             # Extract JSON from response
-            import json
-            import re
-            
             # Find JSON object in response
             json_match = re.search(r'\{[\s\S]*\}', response_text)
             if json_match:
@@ -1292,9 +1388,6 @@ class TemplateGenerator:
                 return []
             
             # Extract JSON from response
-            import json
-            import re
-            
             content = response_text
             
             # Find JSON array in response
@@ -1393,8 +1486,6 @@ class TemplateGenerator:
     
     def _extract_list_from_section(self, content: str, section_name: str, emoji: str) -> List[str]:
         """Extract list items from a markdown section"""
-        import re
-        
         # Find section with emoji or text
         pattern = f"{emoji}.*?{section_name}:?(.*?)(?=###|##|$)"
         match = re.search(pattern, content, re.DOTALL | re.IGNORECASE)
@@ -1416,8 +1507,6 @@ class TemplateGenerator:
     
     def _extract_keyword_formulas(self, content: str) -> List[Dict]:
         """Extract keyword formulas from strategy content"""
-        import re
-        
         formulas = []
         
         # Look for formula patterns like [Variable1] [Variable2] [Topic]
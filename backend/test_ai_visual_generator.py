@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Test script for AI visual generator parsing, caching and fallbacks"""
+
+import sys
+import os
+import json
+import asyncio
+from itertools import islice
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import ai_visual_generator
+from ai_visual_generator import AIVisualGenerator
+
+
+class FakeAIHandler:
+    """Stand-in AI handler that returns a canned visual response"""
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+        self.streamed = 0
+        self.max_tokens = []
+
+    def has_ai_provider(self):
+        return True
+
+    def generate(self, prompt, max_tokens=500, system=None):
+        self.calls += 1
+        self.max_tokens.append(max_tokens)
+        return self.response
+
+    def generate_content_stream(self, prompt, max_tokens=500, system=None):
+        self.calls += 1
+        self.max_tokens.append(max_tokens)
+        for start in range(0, len(self.response), 8):
+            self.streamed = start + 8
+            yield self.response[start:start + 8]
+
+
+SAMPLE_CONTENT = ''.join(f'<p>Paragraph {i}</p>' for i in range(6))
+SAMPLE_TEMPLATE_DATA = {'title': 'Viome vs Thorne', 'pattern': '{Brand A} vs {Brand B}'}
+SAMPLE_ENRICHED_DATA = {'primary_data': {'count': 12, 'average_rating': 4.6}}
+
+
+def test_parse_visual_elements():
+    """Test that top-level divs and tables are extracted with nesting intact"""
+    print("\n=== Testing Visual Element Parsing ===\n")
+
+    visual_gen = AIVisualGenerator()
+    html = ('<div class="a"><div>inner</div></div>\n'
+            '<p>ignored</p><table><tr><td>1</td></tr></table>'
+            '<div>third</div><div>fourth</div>')
+
+    visuals = visual_gen._parse_visual_elements(html)
+
+    assert visuals == [
+        '<div class="a"><div>inner</div></div>',
+        '<table><tr><td>1</td></tr></table>',
+        '<div>third</div>'
+    ]
+    print("✅ PASS: Nested and mixed visual elements parsed")
+
+
+def test_scan_visual_elements():
+    """Test the regex fallback scan used when lxml is unavailable"""
+    print("\n=== Testing Visual Element Tag Scan ===\n")
+
+    visual_gen = AIVisualGenerator()
+
+    assert visual_gen._scan_visual_elements('<div><table><tr><td>x</td></tr></table></div>') == [
+        '<div><table><tr><td>x</td></tr></table></div>'
+    ]
+    assert visual_gen._scan_visual_elements('<div><div>unclosed</div>') == []
+    print("✅ PASS: Unclosed elements are dropped by the tag scan")
+
+
+def test_clean_ai_response():
+    """Test that markdown fences and leading explanations are stripped"""
+    print("\n=== Testing AI Response Cleaning ===\n")
+
+    visual_gen = AIVisualGenerator()
+
+    assert visual_gen._clean_ai_response('Here you go:\n```html\n<div>A</div>\n```\nEnjoy!') == '<div>A</div>'
+    assert visual_gen._clean_ai_response('```\n<table></table>\n```') == '<table></table>'
+    assert visual_gen._clean_ai_response('Sure, here are the visuals:\n<div>B</div>\n') == '<div>B</div>'
+    assert visual_gen._clean_ai_response('```html\n<div>C</div>') == '<div>C</div>'
+    assert visual_gen._clean_ai_response('  no html here ') == 'no html here'
+    print("✅ PASS: AI responses reduced to HTML")
+
+
+def test_insert_visuals_keeps_paragraphs():
+    """Test that visuals land after the intro, middle and final paragraphs"""
+    print("\n=== Testing Visual Insertion ===\n")
+
+    visual_gen = AIVisualGenerator()
+    html = visual_gen._insert_visuals_into_content(
+        SAMPLE_CONTENT, '<div>one</div><div>two</div><div>three</div>'
+    )
+
+    assert html.count('</p>') == SAMPLE_CONTENT.count('</p>')
+    assert html == (
+        '<p>Paragraph 0</p>\n<div>one</div>\n'
+        '<p>Paragraph 1</p><p>Paragraph 2</p><p>Paragraph 3</p>\n<div>two</div>\n'
+        '<p>Paragraph 4</p><p>Paragraph 5</p>\n<div>three</div>\n'
+    )
+    print("✅ PASS: Visuals inserted without dropping closing tags")
+
+
+def test_stream_stops_after_three_visuals():
+    """Test that streaming stops once three complete visuals have arrived"""
+    print("\n=== Testing Streamed Visual Generation ===\n")
+
+    visual_gen = AIVisualGenerator()
+    response = '<div>one</div><div>two</div><table><tr><td>3</td></tr></table>' + '<div>extra</div>' * 50
+    visual_gen.ai_handler = FakeAIHandler(response)
+
+    visual_html = visual_gen._stream_visual_html('prompt', max_tokens=2000)
+
+    assert visual_gen._parse_visual_elements(visual_html)[2] == '<table><tr><td>3</td></tr></table>'
+    assert visual_gen.ai_handler.streamed < len(response)
+    print("✅ PASS: Stream closed after third visual")
+
+
+def test_interrupted_stream_is_not_cached():
+    """Test that a stream failing partway falls back and leaves the cache empty"""
+    print("\n=== Testing Interrupted Stream ===\n")
+
+    class FailingAIHandler(FakeAIHandler):
+        def generate_content_stream(self, prompt, max_tokens=500, system=None):
+            yield from islice(super().generate_content_stream(prompt, max_tokens, system), 2)
+            raise ConnectionError('stream dropped')
+
+    visual_gen = AIVisualGenerator()
+    visual_gen.ai_handler = FailingAIHandler('<div>one</div><div>two</div><div>three</div>')
+
+    html = visual_gen._generate_ai_visuals(SAMPLE_CONTENT, SAMPLE_TEMPLATE_DATA, SAMPLE_ENRICHED_DATA)
+    cache_key = visual_gen.visual_cache.make_key(SAMPLE_CONTENT, SAMPLE_TEMPLATE_DATA, SAMPLE_ENRICHED_DATA)
+
+    assert '<div>one</div>' not in html
+    assert visual_gen.visual_cache.get(cache_key) is None
+    print("✅ PASS: Partial response discarded")
+
+
+def test_ai_visuals_are_cached():
+    """Test that an identical page context reuses the cached AI response"""
+    print("\n=== Testing Visual Cache ===\n")
+
+    visual_gen = AIVisualGenerator()
+    visual_gen.ai_handler = FakeAIHandler('```html\n<div>Stats</div>\n```')
+
+    first = visual_gen._generate_ai_visuals(SAMPLE_CONTENT, SAMPLE_TEMPLATE_DATA, SAMPLE_ENRICHED_DATA)
+    second = visual_gen._generate_ai_visuals(SAMPLE_CONTENT, SAMPLE_TEMPLATE_DATA, SAMPLE_ENRICHED_DATA)
+
+    assert first == second
+    assert '<div>Stats</div>' in first
+    assert visual_gen.ai_handler.calls == 1
+    print("✅ PASS: Second call served from cache")
+
+
+def test_unsortable_keys_skip_cache():
+    """Test that data the stdlib encoder can't sort is enhanced without caching"""
+    print("\n=== Testing Uncacheable Page Data ===\n")
+
+    visual_gen = AIVisualGenerator()
+    visual_gen.ai_handler = FakeAIHandler('<div>Mixed keys</div>')
+    template_data = {**SAMPLE_TEMPLATE_DATA, 1: 'numeric key'}
+    orjson = ai_visual_generator.orjson
+    ai_visual_generator.orjson = None
+    try:
+        html = visual_gen._generate_ai_visuals(SAMPLE_CONTENT, template_data, SAMPLE_ENRICHED_DATA)
+    finally:
+        ai_visual_generator.orjson = orjson
+
+    assert '<div>Mixed keys</div>' in html
+    assert visual_gen.visual_cache.hits + visual_gen.visual_cache.misses == 0
+    print("✅ PASS: Page enhanced without a cache key")
+
+
+def test_batch_visuals_single_request():
+    """Test that a batch of pages is enhanced with one AI request"""
+    print("\n=== Testing Batched Visual Generation ===\n")
+
+    visual_gen = AIVisualGenerator()
+    visual_gen.ai_handler = FakeAIHandler(
+        'Sure! ' + json.dumps({'visuals': [{'i': 0, 'html': '<div>Batch visual</div>'}]})
+    )
+    visual_gen.refresh_provider()
+    items = [
+        {'content_html': SAMPLE_CONTENT, 'template_data': SAMPLE_TEMPLATE_DATA,
+         'enriched_data': SAMPLE_ENRICHED_DATA},
+        {'content_html': SAMPLE_CONTENT, 'template_data': {'title': 'Plumbers in Austin'},
+         'enriched_data': SAMPLE_ENRICHED_DATA}
+    ]
+
+    results = asyncio.run(visual_gen.enhance_content_with_visuals_batch(items))
+
+    assert visual_gen.ai_handler.calls == 1
+    assert '<div>Batch visual</div>' in results[0]
+    assert 'Batch visual' not in results[1]
+    assert 'Average Rating' in results[1]
+    print("✅ PASS: Missing batch entries fall back to basic visuals")
+
+
+def test_batch_size_fits_token_budget():
+    """Test that oversized batches are split so each page keeps its token budget"""
+    print("\n=== Testing Batch Token Budget ===\n")
+
+    visual_gen = AIVisualGenerator()
+    visual_gen.ai_handler = FakeAIHandler(json.dumps({'visuals': []}))
+    visual_gen.refresh_provider()
+    items = [
+        {'content_html': f'<p>Page {i}</p>', 'template_data': SAMPLE_TEMPLATE_DATA,
+         'enriched_data': SAMPLE_ENRICHED_DATA}
+        for i in range(5)
+    ]
+
+    results = asyncio.run(visual_gen.enhance_content_with_visuals_batch(items, batch_size=8))
+
+    assert len(results) == 5
+    assert visual_gen.ai_handler.calls == 3
+    assert sorted(visual_gen.ai_handler.max_tokens) == [2000, 4000, 4000]
+    print("✅ PASS: Five pages sent as three requests")
+
+
+def test_parse_batch_response_ignores_prose():
+    """Test that braces in prose around the JSON object don't break parsing"""
+    print("\n=== Testing Batch Response Parsing ===\n")
+
+    visual_gen = AIVisualGenerator()
+    payload = json.dumps({'visuals': [{'i': 1, 'html': '<div>One</div>'}]})
+
+    assert visual_gen._parse_batch_response(
+        'Using {placeholders}: ' + payload + '\nLet me know if you need {more}!'
+    ) == {1: '<div>One</div>'}
+    assert visual_gen._parse_batch_response('no json here') == {}
+    print("✅ PASS: First JSON object decoded from a chatty response")
+
+
+def test_batch_size_one_streams_each_page():
+    """Test concurrent page enhancement keeps order and shares the cache"""
+    print("\n=== Testing Concurrent Visual Generation ===\n")
+
+    visual_gen = AIVisualGenerator()
+    visual_gen.ai_handler = FakeAIHandler('<div>Async visual</div>')
+    visual_gen.refresh_provider()
+    items = [
+        {'content_html': f'<p>Page {i}</p><p>More</p>', 'template_data': SAMPLE_TEMPLATE_DATA,
+         'enriched_data': SAMPLE_ENRICHED_DATA}
+        for i in range(5)
+    ]
+
+    results = asyncio.run(
+        visual_gen.enhance_content_with_visuals_batch(items + items[:1], batch_size=1, concurrency=2)
+    )
+
+    assert len(results) == 6
+    assert all(html.startswith(f'<p>Page {i % 5}</p>\n<div>Async visual</div>') for i, html in enumerate(results))
+    assert visual_gen.visual_cache.hits + visual_gen.visual_cache.misses == 6
+    print("✅ PASS: Pages enhanced concurrently in order")
+
+
+def test_basic_comparison_fallback():
+    """Test the non-AI fallback builds a comparison table for X vs Y titles"""
+    print("\n=== Testing Basic Visual Fallback ===\n")
+
+    visual_gen = AIVisualGenerator()
+    html = visual_gen._add_basic_visuals(SAMPLE_CONTENT, SAMPLE_TEMPLATE_DATA, SAMPLE_ENRICHED_DATA)
+
+    assert html.startswith('<p>Paragraph 0</p>\n<div')
+    assert '>Viome</th>' in html
+    assert '>Thorne</th>' in html
+    print("✅ PASS: Comparison fallback inserted after first paragraph")
+
+
+if __name__ == "__main__":
+    test_parse_visual_elements()
+    test_scan_visual_elements()
+    test_clean_ai_response()
+    test_insert_visuals_keeps_paragraphs()
+    test_stream_stops_after_three_visuals()
+    test_interrupted_stream_is_not_cached()
+    test_ai_visuals_are_cached()
+    test_unsortable_keys_skip_cache()
+    test_batch_visuals_single_request()
+    test_batch_size_fits_token_budget()
+    test_parse_batch_response_ignores_prose()
+    test_batch_size_one_streams_each_page()
+    test_basic_comparison_fallback()
+    print("\nAll visual generator tests passed!")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Test script for content variation uniqueness scoring"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api.content_variation import ContentVariationEngine
+
+
+SAMPLE_CONTENTS = [
+    "Best plumbers in Austin for emergency repairs",
+    "Best plumbers in Dallas for emergency repairs",
+    "Viome vs Thorne: which gut test is right for you?",
+    "best PLUMBERS in austin for emergency repairs",
+    ""
+]
+
+
+def test_uniqueness_matrix_matches_pairwise_scores():
+    """Test that every matrix cell equals the pairwise uniqueness score"""
+    print("\n=== Testing Uniqueness Matrix ===\n")
+
+    engine = ContentVariationEngine()
+    matrix = engine.calculate_uniqueness_matrix(SAMPLE_CONTENTS)
+
+    assert len(matrix) == len(SAMPLE_CONTENTS)
+    for i, content1 in enumerate(SAMPLE_CONTENTS):
+        assert len(matrix[i]) == len(SAMPLE_CONTENTS)
+        for j, content2 in enumerate(SAMPLE_CONTENTS):
+            assert matrix[i][j] == engine.calculate_uniqueness_score(content1, content2), (i, j)
+    print("✅ PASS: Matrix matches calculate_uniqueness_score for every pair")
+
+
+def test_uniqueness_matrix_empty_batch():
+    """Test that an empty batch gives an empty matrix"""
+    print("\n=== Testing Empty Uniqueness Matrix ===\n")
+
+    assert ContentVariationEngine().calculate_uniqueness_matrix([]) == []
+    print("✅ PASS: Empty batch handled")
+
+
+if __name__ == "__main__":
+    test_uniqueness_matrix_matches_pairwise_scores()
+    test_uniqueness_matrix_empty_batch()
+    print("\nAll content variation tests passed!")